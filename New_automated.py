@@ -1,14 +1,27 @@
-import json
 import csv
 import os
 import glob
 import requests
+import threading
 import time
 import pandas as pd
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 from dotenv import load_dotenv
-import json
 from pathlib import Path
+from instances_reader import find_instance
+from field_catalog import load_field_catalog, RARE_FIELD_TENANT_FRACTION
+from field_store import load_current_field_store, find_instance_in_store
+import json_codec
+from canonical_json import canonicalize, json_deep_equal, CanonicalValue, KIND_OBJECT
+from field_matchers import (DEFAULT_REGISTRY, MatcherRegistry, STATUS_MATCH, STATUS_MISMATCH, STATUS_GT_ABSENT,
+                            structural_partial_matcher)
+from llm_cache import LLMVerdictCache
+from llm_judge import judge_in_batches, map_concurrently, RateLimiter, DEFAULT_BATCH_TOKEN_BUDGET, LLM_CATEGORIES
+from comparison_result import wait_for_report_writes
+from filetype_evaluator import evaluate_file_type, FileTypeEvaluation
+from metrics_calc import compute_metrics, field_leaderboard, bootstrap_ci, DEFAULT_CONFIDENCE
+from run_store import RunStore
+from report_writer import ConsolidatedReportWriter, report_partition_path, write_report_dataset
 # --- Library Setup ---
 try:
     import google.generativeai as genai
@@ -37,7 +50,32 @@ ACCOUNTS_CSV_PATH = os.path.join(SCRIPT_DIR, "accounts_to_run.csv")
 TENANT_INFO_FOLDER = os.path.join(SCRIPT_DIR, "Tenet_info")
 BASE_OUTPUT_FOLDER = os.path.join(SCRIPT_DIR, "outputs")
 BASE_INSTANCES_FOLDER = os.path.join(SCRIPT_DIR, "priority_integration_data")
+FIELD_STORE_PATH = os.path.join(BASE_INSTANCES_FOLDER, "field_store.parquet")  # optional; built by field_store.py
 TIME_LOG_FILE = os.path.join(SCRIPT_DIR, "prediction_times.csv")
+CONSOLIDATED_REPORT_FORMAT = "csv"  # csv, csv.gz or parquet; rows are appended one tenant at a time
+# "csv" writes the per-fileType CSV reports; "parquet" also writes every report into a
+# typed dataset partitioned by fileTypeId and run (requires 'pyarrow')
+REPORT_OUTPUT_FORMAT = "csv"
+REPORT_DATASET_FOLDER = os.path.join(BASE_OUTPUT_FOLDER, "datasets")
+RUN_STORE_PATH = os.path.join(BASE_OUTPUT_FOLDER, "run_store.sqlite")  # run history; see run_store.py
+# Tenants of a fileType compared together in one tenants x fields matrix (and one batched LLM pass);
+# a chunk's reports are written as soon as its last tenant's prediction is in
+EVALUATION_CHUNK_SIZE = 8
+
+# Leaf-overlap scorer that settles JSON partial matches locally (None disables it)
+PARTIAL_MATCH_THRESHOLD = 0.8
+PARTIAL_MATCH_METRIC = "jaccard"  # jaccard, precision, recall or f1
+
+LLM_MODEL_NAME = "gemini-1.5-flash"
+LLM_PROMPT_VERSION = "match-analysis-v1"  # bump whenever the match-analysis prompt changes
+LLM_CACHE_PATH = os.path.join(BASE_OUTPUT_FOLDER, "llm_verdict_cache.sqlite")
+LLM_CACHE_TTL_SECONDS = 30 * 24 * 3600
+LLM_CACHE_MAX_ENTRIES = 50000
+LLM_BATCH_MODE = True  # judge all ambiguous fields of an account in a few batched prompts
+LLM_BATCH_TOKEN_BUDGET = DEFAULT_BATCH_TOKEN_BUDGET
+LLM_MAX_CONCURRENCY = 4  # LLM requests in flight at once
+LLM_REQUESTS_PER_MINUTE = 60  # shared by every comparator in the process; 0 disables the limit
+LLM_RATE_LIMITER = RateLimiter(LLM_REQUESTS_PER_MINUTE)
 
 IGNORED_FIELDS = {
     "filedestination", "filename", "lookback", "integrationmode",
@@ -82,20 +120,19 @@ print(f"Logging started. All terminal output will also be saved to: {log_path}")
 # --- PIPELINE HELPER FUNCTIONS ---
 # ==============================================================================
 
-def create_ground_truth_from_instances(instances_json_path: str, tenant_id: str, output_path: str) -> bool:
+def create_ground_truth_from_instances(instances_json_path: str, tenant_id: str, output_path: str,
+                                      store_table: Optional[Any] = None) -> bool:
     """
     Finds a tenant's data in instances.json and saves it as ground_truth.json.
+    With the fileType's rows from a current field store, the tenant is looked up there instead.
     """
     print(f"\n📄 Generating ground_truth.json for tenant '{tenant_id}'...")
     try:
-        with open(instances_json_path, "r", encoding='utf-8') as f:
-            all_instances = json.load(f)
-
-        tenant_instance_data = None
-        for instance in all_instances:
-            if instance.get("tenantId") == tenant_id:
-                tenant_instance_data = instance
-                break
+        if store_table is not None:
+            tenant_instance_data = find_instance_in_store(store_table, tenant_id)
+        else:
+            # Stream the instances and stop at the tenant's entry instead of loading the whole file
+            tenant_instance_data = find_instance(instances_json_path, tenant_id)
 
         if not tenant_instance_data:
             print(f"   ✗ Tenant '{tenant_id}' not found in '{instances_json_path}'.")
@@ -103,8 +140,7 @@ def create_ground_truth_from_instances(instances_json_path: str, tenant_id: str,
 
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(tenant_instance_data, f, indent=4)
+        json_codec.dump(tenant_instance_data, output_path)
 
         print(f"   ✓ Successfully created ground truth file at: {output_path}")
         return True
@@ -117,28 +153,71 @@ def create_ground_truth_from_instances(instances_json_path: str, tenant_id: str,
         return False
 
 
+# Parsed accounts_to_run.csv, keyed by path; each entry holds the file mtime it was read at.
+_ACCOUNT_TENANT_CACHE: Dict[str, Dict[str, Any]] = {}
+
+
+def load_account_tenant_map(csv_path: str) -> Dict[Tuple[str, str], str]:
+    """
+    Loads accounts_to_run.csv into a {(fileTypeId, account_structure_name): tenantId} dict.
+    The parsed mapping is cached and only re-read when the file's mtime changes.
+    Duplicate account rows, blank tenantIds and tenantIds reused within a fileTypeId
+    are reported once, when the file is (re)loaded.
+    """
+    mtime = os.path.getmtime(csv_path)
+    cached = _ACCOUNT_TENANT_CACHE.get(csv_path)
+    if cached and cached['mtime'] == mtime:
+        return cached['mapping']
+
+    print(f"\n📇 Loading account → tenant mapping from '{csv_path}'...")
+    mapping: Dict[Tuple[str, str], str] = {}
+    duplicate_keys, blank_keys = [], []
+    accounts_per_tenant: Dict[Tuple[str, str], List[str]] = {}
+    with open(csv_path, 'r', newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            key = (row.get('fileTypeId') or '', row.get('account_structure_name') or '')
+            tenant_id = (row.get('tenantId') or '').strip()
+            if not any(k.strip() for k in key) and not tenant_id:
+                continue  # spacer row
+            if not tenant_id:
+                blank_keys.append(key)
+                continue
+            if key in mapping:
+                # Keep the first row, matching the previous "first match wins" lookup.
+                duplicate_keys.append(key)
+                continue
+            mapping[key] = tenant_id
+            accounts_per_tenant.setdefault((key[0], tenant_id), []).append(key[1])
+
+    print(f"   ✓ Loaded {len(mapping)} account mappings.")
+    if blank_keys:
+        print(f"   ⚠️ Warning: {len(blank_keys)} row(s) have a blank tenantId and will be skipped:")
+        for file_type_id, account_name in blank_keys:
+            print(f"      - {file_type_id or '<no fileTypeId>'}: {account_name}")
+    if duplicate_keys:
+        print(f"   ⚠️ Warning: {len(duplicate_keys)} duplicate account row(s); the first entry is used:")
+        for file_type_id, account_name in duplicate_keys:
+            print(f"      - {file_type_id or '<no fileTypeId>'}: {account_name}")
+    shared = {k: names for k, names in accounts_per_tenant.items() if len(names) > 1}
+    if shared:
+        print(f"   ⚠️ Warning: {len(shared)} tenantId(s) are mapped to several accounts of the same fileTypeId:")
+        for (file_type_id, tenant_id), names in shared.items():
+            print(f"      - {file_type_id} / {tenant_id}: {'; '.join(names)}")
+
+    _ACCOUNT_TENANT_CACHE[csv_path] = {'mtime': mtime, 'mapping': mapping}
+    return mapping
+
+
 def get_tenant_id_from_csv(csv_path: str, file_type_id: str, account_name: str) -> Optional[str]:
     """
-    Reads the accounts_to_run.csv to find the tenantId for a given account,
+    Looks up the tenantId for a given account in accounts_to_run.csv,
     ignoring the file extension of the account_name.
     """
-    print(f"\n🔍 Searching for account name (without extension) in '{csv_path}'...")
     account_name_without_extension = os.path.splitext(account_name)[0]
-    print(f"   Looking for File Type: '{file_type_id}', Account Name: '{account_name_without_extension}'")
+    print(f"\n🔍 Looking for File Type: '{file_type_id}', Account Name: '{account_name_without_extension}'")
 
     try:
-        df = pd.read_csv(csv_path)
-        result = df[
-            (df['fileTypeId'] == file_type_id) &
-            (df['account_structure_name'] == account_name_without_extension)
-            ]
-        if not result.empty:
-            tenant_id = result.iloc[0]['tenantId']
-            print(f"   ✓ Found tenantId: {tenant_id}")
-            return str(tenant_id)
-        else:
-            print(f"   ✗ No entry found for the given file type and account name.")
-            return None
+        mapping = load_account_tenant_map(csv_path)
     except FileNotFoundError:
         print(f"   ✗ FATAL ERROR: The account mapping file was not found at '{csv_path}'.")
         return None
@@ -146,6 +225,13 @@ def get_tenant_id_from_csv(csv_path: str, file_type_id: str, account_name: str)
         print(f"   ✗ FATAL ERROR: Failed to read or process the CSV file. Error: {e}")
         return None
 
+    tenant_id = mapping.get((file_type_id, account_name_without_extension))
+    if tenant_id:
+        print(f"   ✓ Found tenantId: {tenant_id}")
+        return tenant_id
+    print(f"   ✗ No entry found for the given file type and account name.")
+    return None
+
 
 def upload_account_structure_file(
         upload_endpoint: str, source_file_path: str, destination_filename: str,
@@ -189,12 +275,11 @@ def find_tenant_info(tenant_id_to_find: str, tenant_info_folder: str) -> Optiona
         return None
     for file_path in json_files:
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            data = json_codec.load(file_path)
             if tenant_id_to_find in data:
                 print(f"   ✓ Found tenant information in {os.path.basename(file_path)}.")
                 return data[tenant_id_to_find]
-        except (json.JSONDecodeError, IOError) as e:
+        except (json_codec.JSONDecodeError, IOError) as e:
             print(f"   ⚠️ Warning: Could not read or parse {file_path}. Error: {e}")
     print(f"   ✗ Tenant Info for '{tenant_id_to_find}' not found in any files.")
     return None
@@ -222,16 +307,15 @@ def fetch_and_save_predictions(api_endpoint: str, headers: Dict[str, str], paylo
                 duration
             )
             response.raise_for_status()  # raises for 4xx/5xx
-            prediction_data = response.json()
+            prediction_data = json_codec.loads(response.content)
             file_path = os.path.join(output_dir, "iter1.json")
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(prediction_data, f, indent=4)
+            json_codec.dump(prediction_data, file_path)
             print(f"   ✓ Successfully saved prediction to {file_path}")
             return file_path, duration
 
         except (requests.exceptions.HTTPError,
                 requests.exceptions.RequestException,
-                json.JSONDecodeError) as err:
+                json_codec.JSONDecodeError) as err:
             print(f"   ✗ Attempt {attempt} failed: {err}")
             if attempt < 3:
                 print("   Waiting 90 seconds before next retry...")
@@ -254,116 +338,82 @@ def log_prediction_time(file_path: str, file_type_id: str, tenant_id: str, durat
         writer.writerow([time.strftime('%Y-%m-%d %H:%M:%S'), file_type_id, tenant_id, f"{duration:.4f}"])
 
 
-def calculate_metrics_from_csv(csv_file_path: str) -> Dict[str, Any]:
+def generate_exhaustive_field_list(instances_json_path: str, store_table: Optional[Any] = None) -> List[str]:
     """
-    Calculates accuracy, coverage, and extra fields metrics from the coverage report CSV.
-
-    Args:
-        csv_file_path: Path to the coverage report CSV file
-
-    Returns:
-        Dictionary containing calculated metrics
+    Generates a comprehensive list of all unique fields from instances.json.
+    The list comes from the field catalog, which is cached next to instances.json
+    and only rebuilt when the file's content hash changes (from the field store rows, if given).
     """
-    print(f"\n📊 Calculating metrics from: {csv_file_path}")
-
+    print(f"\n🔍 Generating exhaustive field list from: {instances_json_path}")
     try:
-        df = pd.read_csv(csv_file_path)
-
-        # Get the status column (assuming it's Status_v1 for single iteration)
-        status_col = 'Status_v1' if 'Status_v1' in df.columns else 'Status'
+        unique_keys_list = sorted(load_field_catalog(instances_json_path, store_table=store_table))
+        print(f"✓ Found {len(unique_keys_list)} unique fields.")
+        return unique_keys_list
+    except FileNotFoundError:
+        print(f"✗ FATAL ERROR: Instances file not found at: {instances_json_path}")
+        return []
+    except Exception as e:
+        print(f"✗ FATAL ERROR: Could not process instances file. Error: {e}")
+        return []
 
-        # Calculate counts for different status types
-        gt_present_pr_present_match = len(df[df[status_col] == "GT Present PR Present and match"])
-        gt_present_pr_present_mismatch = len(df[df[status_col] == "GT Present PR Present but mismatch"])
-        gt_present_pr_absent = len(df[df[status_col] == "GT Present PR Absent"])
-        gt_absent_pr_present = len(df[df[status_col] == "GT Absent PR Present"])
-        gt_absent_pr_absent = len(df[df[status_col] == "GT Absent PR Absent"])
 
-        # Calculate Coverage
-        coverage_numerator = gt_present_pr_present_match + gt_present_pr_present_mismatch
-        coverage_denominator = coverage_numerator + gt_present_pr_absent
+# ==============================================================================
+# --- LLM CLIENT (process-wide singleton) ---
+# ==============================================================================
+_LLM_MODEL: Optional[Any] = None
+_LLM_MODEL_READY = False
+_LLM_MODEL_LOCK = threading.Lock()
 
-        if coverage_denominator > 0:
-            coverage = coverage_numerator / coverage_denominator
-        else:
-            coverage = 0.0
 
-        # Calculate Accuracy
-        accuracy_numerator = gt_present_pr_present_match
-        accuracy_denominator = gt_present_pr_present_match + gt_present_pr_present_mismatch
+def _create_llm_model() -> Optional[Any]:
+    if not LLM_AVAILABLE:
+        print("⚠️ Warning: 'google-generativeai' package not found. LLM features disabled.")
+        return None
+    try:
+        # Try multiple ways to get the API key
+        api_key = os.environ.get("GEMINI_API_KEY")
+        if not api_key:
+            # Try to read from a .env file or config file
+            try:
+                load_dotenv()
+                api_key = os.environ.get("GEMINI_API_KEY")
+            except:
+                pass
 
-        if accuracy_denominator > 0:
-            accuracy = accuracy_numerator / accuracy_denominator
-        else:
-            accuracy = 0.0
-
-        # Extra fields predicted (GT Absent PR Present)
-        extra_fields_count = gt_absent_pr_present
-        extra_fields_list = df[df[status_col] == "GT Absent PR Present"]['FieldName'].tolist()
-
-        # Total fields analyzed
-        total_fields = len(df)
-
-        metrics = {
-            'total_fields': total_fields,
-            'gt_present_pr_present_match': gt_present_pr_present_match,
-            'gt_present_pr_present_mismatch': gt_present_pr_present_mismatch,
-            'gt_present_pr_absent': gt_present_pr_absent,
-            'gt_absent_pr_present': gt_absent_pr_present,
-            'gt_absent_pr_absent': gt_absent_pr_absent,
-            'coverage': round(coverage, 4),
-            'accuracy': round(accuracy, 4),
-            'extra_fields_count': extra_fields_count,
-            'extra_fields_list': extra_fields_list
-        }
+        if not api_key:
+            print("⚠️ Warning: GEMINI_API_KEY not found in environment variables.")
+            print("   To enable LLM features, set the GEMINI_API_KEY environment variable or")
+            print("   add it to a .env file in the script directory.")
+            return None
 
-        print(f"   ✓ Coverage: {coverage:.4f} ({coverage_numerator}/{coverage_denominator})")
-        print(f"   ✓ Accuracy: {accuracy:.4f} ({accuracy_numerator}/{accuracy_denominator})")
-        print(f"   ✓ Extra fields predicted: {extra_fields_count}")
+        genai.configure(api_key=api_key)
+        model = genai.GenerativeModel(LLM_MODEL_NAME)
+        print("✓ LLM (Gemini) configured successfully.")
+        return model
+    except Exception as e:
+        print(f"✗ Error configuring LLM: {e}")
+        return None
 
-        return metrics
 
-    except Exception as e:
-        print(f"   ✗ Error calculating metrics: {e}")
-        return {
-            'total_fields': 0,
-            'gt_present_pr_present_match': 0,
-            'gt_present_pr_present_mismatch': 0,
-            'gt_present_pr_absent': 0,
-            'gt_absent_pr_present': 0,
-            'gt_absent_pr_absent': 0,
-            'coverage': 0.0,
-            'accuracy': 0.0,
-            'extra_fields_count': 0,
-            'extra_fields_list': []
-        }
+def get_llm_model() -> Optional[Any]:
+    """
+    Returns the Gemini model shared by every comparator in the process. It is created
+    lazily on first use (thread-safe); a failed setup is remembered until reset_llm_model().
+    """
+    global _LLM_MODEL, _LLM_MODEL_READY
+    if not _LLM_MODEL_READY:
+        with _LLM_MODEL_LOCK:
+            if not _LLM_MODEL_READY:
+                _LLM_MODEL = _create_llm_model()
+                _LLM_MODEL_READY = True
+    return _LLM_MODEL
 
 
-def generate_exhaustive_field_list(instances_json_path: str) -> List[str]:
-    """Generates a comprehensive list of all unique fields from instances.json."""
-    print(f"\n🔍 Generating exhaustive field list from: {instances_json_path}")
-    try:
-        with open(instances_json_path, "r", encoding='utf-8') as f:
-            data = json.load(f)
-        unique_keys = set()
-        for integration in data:
-            for key in integration.keys():
-                if key != "fileTransferFields":
-                    unique_keys.add(key)
-            fields = integration.get("fileTransferFields", [])
-            for field in fields:
-                key = field.get("key")
-                if key:
-                    unique_keys.add(key)
-        unique_keys_list = sorted(list(unique_keys))
-        print(f"✓ Found {len(unique_keys_list)} unique fields.")
-        return unique_keys_list
-    except FileNotFoundError:
-        print(f"✗ FATAL ERROR: Instances file not found at: {instances_json_path}")
-        return []
-    except Exception as e:
-        print(f"✗ FATAL ERROR: Could not process instances file. Error: {e}")
-        return []
+def reset_llm_model() -> None:
+    """Drops the shared client so the next get_llm_model() configures it again (e.g. after a new API key)."""
+    global _LLM_MODEL, _LLM_MODEL_READY
+    with _LLM_MODEL_LOCK:
+        _LLM_MODEL, _LLM_MODEL_READY = None, False
 
 
 # ==============================================================================
@@ -372,48 +422,29 @@ def generate_exhaustive_field_list(instances_json_path: str) -> List[str]:
 class PredictionComparator:
     """Handles comparison between ground truth and predictions."""
 
-    def __init__(self, gt_json_path: str, exhaustive_fields: List[str]):
-        self.gt_path = gt_json_path
+    def __init__(self, exhaustive_fields: List[str], file_type_id: Optional[str] = None,
+                 matcher_registry: Optional[MatcherRegistry] = None, llm_cache: Optional[LLMVerdictCache] = None,
+                 batch_llm: bool = LLM_BATCH_MODE, llm_max_workers: int = LLM_MAX_CONCURRENCY,
+                 partial_match_threshold: Optional[float] = PARTIAL_MATCH_THRESHOLD):
         self.exhaustive_fields = set(field.lower() for field in exhaustive_fields)
-        self.llm_model = self._setup_llm()
+        self.file_type_id = file_type_id
+        self.matcher_registry = matcher_registry or DEFAULT_REGISTRY
+        self.llm_cache = llm_cache
+        self.batch_llm = batch_llm
+        self.llm_max_workers = llm_max_workers
+        self.partial_match_threshold = partial_match_threshold
         self.ignored_fields = IGNORED_FIELDS
 
-    def _setup_llm(self) -> Optional[Any]:
-        if not LLM_AVAILABLE:
-            print("⚠️ Warning: 'google-generativeai' package not found. LLM features disabled.")
-            return None
-        try:
-            # Try multiple ways to get the API key
-            api_key = os.environ.get("GEMINI_API_KEY")
-            if not api_key:
-                # Try to read from a .env file or config file
-                try:
-                    from dotenv import load_dotenv
-                    load_dotenv()
-                    api_key = os.environ.get("GEMINI_API_KEY")
-                except:
-                    pass
-
-            if not api_key:
-                print("⚠️ Warning: GEMINI_API_KEY not found in environment variables.")
-                print("   To enable LLM features, set the GEMINI_API_KEY environment variable or")
-                print("   add it to a .env file in the script directory.")
-                return None
-
-            genai.configure(api_key=api_key)
-            model = genai.GenerativeModel('gemini-1.5-flash')
-            print("✓ LLM (Gemini) configured successfully.")
-            return model
-        except Exception as e:
-            print(f"✗ Error configuring LLM: {e}")
-            return None
+    @property
+    def llm_model(self) -> Optional[Any]:
+        # Shared process-wide client, created on first use
+        return get_llm_model()
 
     def _load_prediction_data(self, file_path: str) -> Dict[str, Any]:
         """Load prediction data from a specific file, ensuring clean state."""
         try:
             print(f"   Loading prediction data from: {file_path}")
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            data = json_codec.load(file_path)
 
             # Create a fresh dictionary for this prediction file
             flattened_data = {}
@@ -435,12 +466,11 @@ class PredictionComparator:
             print(f"✗ Error loading prediction file {file_path}: {e}")
             return {}
 
-    def _load_ground_truth_data(self) -> Dict[str, Any]:
+    def _load_ground_truth_data(self, gt_path: str) -> Dict[str, Any]:
         """Load ground truth data, ensuring clean state."""
         try:
-            print(f"   Loading ground truth data from: {self.gt_path}")
-            with open(self.gt_path, 'r', encoding='utf-8') as f:
-                instance = json.load(f)
+            print(f"   Loading ground truth data from: {gt_path}")
+            instance = json_codec.load(gt_path)
 
             # Create a fresh dictionary for ground truth
             gt_data = {}
@@ -462,126 +492,123 @@ class PredictionComparator:
             return gt_data
 
         except Exception as e:
-            print(f"✗ Error loading ground truth file {self.gt_path}: {e}")
+            print(f"✗ Error loading ground truth file {gt_path}: {e}")
             return {}
 
-    def compare_single_prediction(self, prediction_file_path: str, output_csv_path: str):
-        """Compare a single prediction file against ground truth."""
-        print(f"\n🔄 Starting comparison for: {prediction_file_path}")
+    def evaluate_file_type(self, tenant_runs: List[Dict[str, Any]]) -> FileTypeEvaluation:
+        """
+        Compares a batch of the fileType's tenants in one pass (main() passes chunks of up to
+        EVALUATION_CHUNK_SIZE tenants). Each run needs 'gt_path' and 'prediction_path'; its
+        other keys (tenantId, accountStructureFile, ...) are kept as the tenant's metadata.
+        """
+        print(f"\n🔄 Starting comparison for {len(tenant_runs)} tenant(s)...")
+        gt_data_list = [self._load_ground_truth_data(run['gt_path']) for run in tenant_runs]
+        pr_data_list = [self._load_prediction_data(run['prediction_path']) for run in tenant_runs]
+        tenants = [{k: v for k, v in run.items() if k not in ('gt_path', 'prediction_path')} for run in tenant_runs]
+        return evaluate_file_type(tenants, gt_data_list, pr_data_list, self.exhaustive_fields, self.ignored_fields,
+                                  self._decide_pairs, self._absent_match_type, self._format_value)
+
+    def _decide_pairs(self, items: List[Tuple[str, Any, Any]]) -> List[Tuple[str, str]]:
+        """Rule-based decisions first; whatever is left goes to the LLM in one pass."""
+        decisions = [self._decide_without_llm(*item) for item in items]
+        llm_pending = [k for k, decision in enumerate(decisions) if decision is None]
+        if llm_pending:
+            llm_decisions = self._judge_fields_with_llm([
+                (items[k][0], canonicalize(items[k][1]).text, canonicalize(items[k][2]).text) for k in llm_pending
+            ])
+            for k, decision in zip(llm_pending, llm_decisions):
+                decisions[k] = decision
+        return decisions
+
+    def _absent_match_type(self, field_name: str, gt_value: Any) -> Optional[str]:
+        # Toggle fields missing from the prediction count as correct when the GT step is hidden
+        if field_name.startswith('toggle-'):
+            gt = canonicalize(self._format_value(gt_value))
+            if gt.kind == KIND_OBJECT and gt.parsed.get('hidden') is True:
+                return "correctly_absent_as_hidden"
+        return None
 
-        # Load data fresh for each comparison
-        gt_data = self._load_ground_truth_data()
-        pr_data = self._load_prediction_data(prediction_file_path)
+    def _decide_without_llm(self, field_name: str, gt_value: Any, pr_value: Any) -> Optional[Tuple[str, str]]:
+        """Exact, field-specific and JSON checks; returns None when only the LLM can decide."""
+        # Each value is parsed at most once and shared by every check below
+        gt, pr = canonicalize(gt_value), canonicalize(pr_value)
 
-        if not gt_data:
-            print("✗ Aborting due to error in loading ground truth data.")
-            return
+        # Exact match
+        if gt.text == pr.text:
+            return STATUS_MATCH, "exact_match"
 
-        # Determine all fields to check
-        all_fields_to_check = self.exhaustive_fields.union(gt_data.keys()).union(pr_data.keys())
-        final_fields = sorted([f for f in all_fields_to_check if f.lower() not in self.ignored_fields])
-
-        print(f"✓ Comparing {len(final_fields)} fields")
-        print(f"   GT fields: {len(gt_data)}")
-        print(f"   PR fields: {len(pr_data)}")
-
-        report_data = []
-
-        for field in final_fields:
-            gt_present = field in gt_data
-            gt_value = gt_data.get(field)
-
-            pr_present = field in pr_data
-            pr_value = pr_data.get(field)
-            if pr_value=="none":
-                status = "GT Absent PR Absent"
-                match_type = "N/A"
-            # Determine status
-            if gt_present and pr_present:
-                status, match_type = self._determine_match_status(field, gt_value, pr_value)
-            elif gt_present and not pr_present:
-                status = "GT Present PR Absent"
-                match_type = "N/A"
-                # Special handling for toggle fields
-                if field.startswith('toggle-'):
-                    gt_str = self._format_value(gt_value)
-                    if self._is_json_string(gt_str):
-                        try:
-                            gt_json = json.loads(gt_str)
-                            if gt_json.get('hidden') is True:
-                                match_type = "correctly_absent_as_hidden"
-                        except json.JSONDecodeError:
-                            pass
-            elif not gt_present and pr_present:
-                status = "GT Absent PR Present"
-                match_type = "N/A"
-            else:  # not gt_present and not pr_present
-                status = "GT Absent PR Absent"
-                match_type = "N/A"
-
-            row = {
-                "FieldName": field,
-                "Ground_Truth_Value": self._format_value(gt_value),
-                "Predicted_Value_v1": self._format_value(pr_value),
-                "Status_v1": status,
-                "Match_Type_v1": match_type
-            }
-            report_data.append(row)
+        # Field-specific matchers (toggle-*, *Filters, *BenefitPlan, *PlanType, ...)
+        decision = self.matcher_registry.match(field_name, gt, pr, self.file_type_id)
+        if decision is not None:
+            return decision
 
-        # Write the report
-        if not report_data:
-            print("⚠️ No data to write to report.")
-            return
-
-        try:
-            os.makedirs(os.path.dirname(output_csv_path), exist_ok=True)
-            with open(output_csv_path, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=report_data[0].keys())
-                writer.writeheader()
-                writer.writerows(report_data)
-            print(f"\n✅ Successfully generated comparison report: {output_csv_path}")
-        except Exception as e:
-            print(f"✗ Error writing to CSV file {output_csv_path}: {e}")
+        # JSON comparison
+        if gt.is_json and pr.is_json:
+            if self._compare_json_values(gt, pr):
+                return STATUS_MATCH, "json_partial_match"
 
-    def _determine_match_status(self, field_name: str, gt_value: Any, pr_value: Any) -> tuple[str, str]:
-        gt_str = str(gt_value).strip()
-        pr_str = str(pr_value).strip()
+        # Leaf overlap of structured values; only unstructured pairs are left for the LLM
+        if self.partial_match_threshold is not None:
+            decision = structural_partial_matcher(field_name, gt, pr, self.partial_match_threshold,
+                                                  PARTIAL_MATCH_METRIC)
+            if decision is not None:
+                return decision
 
-        # Exact match
-        if gt_str == pr_str:
-            return "GT Present PR Present and match", "exact_match"
+        return None
 
-        # Toggle field special handling
-        if field_name.startswith('toggle-') and self._is_json_string(gt_str) and self._is_json_string(pr_str):
-            try:
-                gt_json = json.loads(gt_str)
-                pr_json = json.loads(pr_str)
-                if 'hidden' in gt_json and 'hidden' in pr_json:
-                    if gt_json['hidden'] == pr_json['hidden']:
-                        return "GT Present PR Present and match", "toggle_match_hidden_only"
-                    else:
-                        return "GT Present PR Present but mismatch", "incorrect_toggle_hidden_mismatch"
-            except json.JSONDecodeError:
-                pass
+    def _judge_fields_with_llm(self, items: List[Tuple[str, str, str]]) -> List[Tuple[str, str]]:
+        """
+        Decides (field_name, gt_text, pr_text) items the rules could not settle. Cached
+        verdicts are reused; the rest are judged in batched prompts (or one prompt per
+        field when batching is off), with a single-field fallback for unparsed items.
+        Without a model, cache misses count as 'incorrect'.
+        """
+        verdicts: List[Optional[str]] = [
+            self.llm_cache.get(*item) if self.llm_cache else None for item in items
+        ]
+        pending = [i for i, verdict in enumerate(verdicts) if verdict is None]
 
-        # JSON comparison
-        if self._is_json_string(gt_str) and self._is_json_string(pr_str):
-            if self._compare_json_values(gt_str, pr_str):
-                return "GT Present PR Present and match", "json_partial_match"
-
-        # LLM analysis
-        if self.llm_model:
-            field_data = {
-                'field_name': field_name,
-                'predicted_value': pr_str,
-                'gt_value': gt_str
-            }
-            llm_result = self._call_llm_for_match_analysis(field_data)
-            if llm_result in ['json_partial_correct']:
-                return "GT Present PR Present and match", llm_result
-            return "GT Present PR Present but mismatch", llm_result
+        if not self.llm_model:
+            return [self._llm_decision(verdict or "incorrect") for verdict in verdicts]
 
-        return "GT Present PR Present but mismatch", "incorrect"
+        if pending and self.batch_llm and len(pending) > 1:
+            batch_items = [
+                {'id': i, 'field_name': items[i][0], 'gt_value': items[i][1], 'predicted_value': items[i][2]}
+                for i in pending
+            ]
+            print(f"   🤖 Judging {len(pending)} ambiguous fields with batched LLM prompts...")
+            batch_verdicts = judge_in_batches(batch_items, self._generate_llm_text,
+                                              token_budget=LLM_BATCH_TOKEN_BUDGET,
+                                              max_workers=self.llm_max_workers, rate_limiter=LLM_RATE_LIMITER)
+            for i, verdict in batch_verdicts.items():
+                verdicts[i] = verdict
+
+        # Single-field prompts for whatever is left, judged concurrently and merged back in field order
+        unresolved = [i for i in pending if verdicts[i] is None]
+        single_verdicts = map_concurrently(
+            lambda i: self._call_llm_for_match_analysis(
+                {'field_name': items[i][0], 'predicted_value': items[i][2], 'gt_value': items[i][1]}),
+            unresolved, self.llm_max_workers, LLM_RATE_LIMITER)
+        for i, verdict in zip(unresolved, single_verdicts):
+            verdicts[i] = verdict
+
+        # Only well-formed categories are cached; errors and free-text replies are asked again next run
+        if self.llm_cache:
+            for i in pending:
+                if verdicts[i] in LLM_CATEGORIES:
+                    self.llm_cache.put(*items[i], verdicts[i])
+
+        return [self._llm_decision(verdict) for verdict in verdicts]
+
+    @staticmethod
+    def _llm_decision(llm_result: str) -> Tuple[str, str]:
+        if llm_result in ['json_partial_correct']:
+            return STATUS_MATCH, llm_result
+        return STATUS_MISMATCH, llm_result
+
+    def _generate_llm_text(self, prompt: str) -> str:
+        response = self.llm_model.generate_content(prompt)
+        return getattr(response, 'text', '')
 
     def _call_llm_for_match_analysis(self, field_data: Dict[str, Any]) -> str:
         if not self.llm_model:
@@ -618,35 +645,12 @@ class PredictionComparator:
         if value is None:
             return ""
         if isinstance(value, (dict, list)):
-            return json.dumps(value)
+            return json_codec.dumps_report(value)
         return str(value)
 
-    def _is_json_string(self, value: str) -> bool:
-        if not isinstance(value, str) or not value.startswith(('[', '{')):
-            return False
-        try:
-            json.loads(value)
-            return True
-        except (json.JSONDecodeError, TypeError):
-            return False
-
-    def _compare_json_values(self, gt_json_str: str, pred_json_str: str) -> bool:
-        try:
-            gt_json = json.loads(gt_json_str)
-            pred_json = json.loads(pred_json_str)
-
-            if isinstance(gt_json, dict) and isinstance(pred_json, dict):
-                return gt_json == pred_json
-
-            if isinstance(gt_json, list) and isinstance(pred_json, list):
-                gt_set = set(frozenset(d.items()) if isinstance(d, dict) else d for d in gt_json)
-                pred_set = set(frozenset(d.items()) if isinstance(d, dict) else d for d in pred_json)
-                return gt_set == pred_set
-
-            return False
-        except Exception:
-            return False
-
+    def _compare_json_values(self, gt: CanonicalValue, pr: CanonicalValue) -> bool:
+        # Deep equality up to key order, with lists compared as multisets (see canonical_json)
+        return json_deep_equal(gt, pr)
 
 # ==============================================================================
 # --- MAIN ORCHESTRATION FUNCTION - UPDATED ---
@@ -658,8 +662,7 @@ def choose_filetypes_and_ids():
     """
     # load mapping
     mapping_path = Path(__file__).parent / "integration_id.json"
-    with open(mapping_path, "r") as f:
-        mapping = json.load(f)["integration_ids_mapping"]
+    mapping = json_codec.load(mapping_path)["integration_ids_mapping"]
 
     filetypes = list(mapping.keys())
 
@@ -710,7 +713,7 @@ def get_bearer_token() -> str:
     try:
         resp = requests.post(url, headers=headers, data=data, timeout=30)
         resp.raise_for_status()
-        token = resp.json().get("access_token")
+        token = json_codec.loads(resp.content).get("access_token")
         if not token:
             raise RuntimeError("No access_token in response.")
         print("✓ Obtained Bearer token from UKG auth server.")
@@ -723,6 +726,46 @@ def get_bearer_token() -> str:
 
 
 
+def evaluate_tenant_chunk(comparator: PredictionComparator, tenant_runs: List[Dict[str, Any]],
+                          consolidated_writer: ConsolidatedReportWriter,
+                          dataset_writer: Optional[ConsolidatedReportWriter], summary_groups: tuple,
+                          metrics_out: List[Dict[str, Any]]) -> pd.DataFrame:
+    """
+    Compares a chunk of a fileType's tenants in one tenants x fields pass, then streams each
+    tenant's report to its coverage CSV and to the consolidated writers and appends its
+    metrics to 'metrics_out'. Returns the chunk's status rows for the fileType summary.
+    """
+    evaluation = comparator.evaluate_file_type(tenant_runs)
+    status_frames = []
+    for t, tenant_df in enumerate(evaluation.iter_tenant_reports()):
+        tenant = evaluation.tenants[t]
+        tenant_id, file_type_id = tenant['tenantId'], tenant['fileTypeId']
+
+        run_output_path = os.path.join(BASE_OUTPUT_FOLDER, file_type_id, tenant_id)
+        output_report_file = os.path.join(run_output_path, f"coverage_report_{tenant_id}.csv")
+        # Per-tenant CSVs are an optional sink; they are written while the next chunk is processed
+        evaluation.tenant_result(t).write_csv(output_report_file, background=True)
+        if REPORT_OUTPUT_FORMAT == "parquet":
+            write_report_dataset(tenant_df.drop(columns='accountStructureFile'), REPORT_DATASET_FOLDER,
+                                 "coverage_report", file_type_id, timestamp, part=tenant_id)
+
+        consolidated_writer.append(tenant_df)
+        if dataset_writer:
+            dataset_writer.append(tenant_df)
+        # Only the status columns are kept for the fileType summary; the values go with the tenant
+        status_df = tenant_df[['tenantId', 'accountStructureFile', 'FieldName', 'Status_v1', 'Match_Type_v1']] \
+            .assign(fileTypeId=file_type_id)
+        status_frames.append(status_df)
+
+        metrics = {**tenant, **compute_metrics(status_df, summary_groups)['tenant'].to_dict('records')[0]}
+        metrics['extra_fields_list'] = status_df.loc[status_df['Status_v1'] == STATUS_GT_ABSENT,
+                                                     'FieldName'].tolist()
+        metrics_out.append(metrics)
+        print(f"   ✓ {tenant_id}: Coverage {metrics['coverage']:.4f}, "
+              f"Accuracy {metrics['accuracy']:.4f}, Extra fields {metrics['extra_fields_count']}")
+    return pd.concat(status_frames, ignore_index=True)
+
+
 def main():
     """Main orchestration function for the pipeline."""
     print("=" * 70)
@@ -730,6 +773,38 @@ def main():
     print("=" * 70)
 
     selections = choose_filetypes_and_ids()
+
+    # Load (and sanity-check) the account → tenant mapping once, before any account is processed
+    try:
+        load_account_tenant_map(ACCOUNTS_CSV_PATH)
+    except Exception as e:
+        print(f"✗ Could not load the account mapping file '{ACCOUNTS_CSV_PATH}': {e}")
+
+    # One verdict cache for the whole run, shared by every comparator
+    try:
+        llm_cache = LLMVerdictCache(LLM_CACHE_PATH, LLM_PROMPT_VERSION, LLM_MODEL_NAME,
+                                    ttl_seconds=LLM_CACHE_TTL_SECONDS, max_entries=LLM_CACHE_MAX_ENTRIES)
+    except Exception as e:
+        print(f"⚠️ Warning: LLM verdict cache disabled. Error: {e}")
+        llm_cache = None
+
+    # Every run's configuration and metrics are kept in the run store for regression checks
+    try:
+        run_store = RunStore(RUN_STORE_PATH)
+        run_store.start_run(timestamp, {
+            'prediction_api_endpoint': PREDICTION_API_ENDPOINT,
+            'file_type_ids': list(selections.keys()),
+            'llm_model': LLM_MODEL_NAME,
+            'llm_prompt_version': LLM_PROMPT_VERSION,
+            'llm_batch_mode': LLM_BATCH_MODE,
+            'partial_match_threshold': PARTIAL_MATCH_THRESHOLD,
+            'partial_match_metric': PARTIAL_MATCH_METRIC,
+            'ignored_fields': sorted(IGNORED_FIELDS),
+        })
+    except Exception as e:
+        print(f"⚠️ Warning: run store disabled. Error: {e}")
+        run_store = None
+
     # loop over each chosen fileTypeId and its integrationIds
     for file_type, integration_ids in selections.items():
 
@@ -771,6 +846,7 @@ def main():
             gemini_key = input("Enter your Gemini API Key (or press Enter to skip LLM features): ").strip()
             if gemini_key:
                 os.environ["GEMINI_API_KEY"] = gemini_key
+                reset_llm_model()
                 print("✓ Gemini API key set for this session.")
             else:
                 print("⚠️ LLM features will be disabled for this run.")
@@ -782,14 +858,30 @@ def main():
 
             # --- Step 3: Setup for the Run ---
         instances_json_path = os.path.join(BASE_INSTANCES_FOLDER, file_type_id, "instances.json")
-        exhaustive_field_list = generate_exhaustive_field_list(instances_json_path)
+        # The fileType's rows of the columnar field store, if it is built and up to date
+        field_store_table = load_current_field_store(FIELD_STORE_PATH, file_type_id, instances_json_path)
+        exhaustive_field_list = generate_exhaustive_field_list(instances_json_path, field_store_table)
         if not exhaustive_field_list:
             print("\n✗ Aborting: Could not generate the field list from instances.json.")
             return
 
-        all_tenants_report_data = []
+        comparator = PredictionComparator(
+            exhaustive_fields=exhaustive_field_list,
+            file_type_id=file_type_id,
+            llm_cache=llm_cache
+        )
+        # The consolidated report is streamed: each tenant's rows are appended as soon as its chunk is compared
+        consolidated_writer = ConsolidatedReportWriter(
+            os.path.join(BASE_OUTPUT_FOLDER, file_type_id, "consolidated_report"), CONSOLIDATED_REPORT_FORMAT)
+        dataset_writer = ConsolidatedReportWriter(
+            report_partition_path(REPORT_DATASET_FOLDER, "consolidated_report", file_type_id, timestamp),
+            "parquet") if REPORT_OUTPUT_FORMAT == "parquet" else None
+        # Status rows of every compared tenant, keyed by summary_groups, for the fileType summary
+        summary_groups = ('fileTypeId', 'tenantId', 'accountStructureFile')
+        status_frames = []
         all_tenants_metrics_data = []
         all_latency_data = []
+        pending_runs = []  # tenants whose predictions are in but not yet compared
 
         # --- Step 4: Main Loop to Process Each Discovered Account ---
         for i, (account_filename, integration_id) in enumerate(accounts_to_process):
@@ -804,7 +896,8 @@ def main():
 
             run_output_path = os.path.join(BASE_OUTPUT_FOLDER, file_type_id, tenant_id)
             ground_truth_file = os.path.join(run_output_path, "ground_truth.json")
-            if not create_ground_truth_from_instances(instances_json_path, tenant_id, ground_truth_file):
+            if not create_ground_truth_from_instances(instances_json_path, tenant_id, ground_truth_file,
+                                                      field_store_table):
                 print(f"✗ Skipping this account: could not create its ground truth file.")
                 continue
 
@@ -882,48 +975,42 @@ def main():
             #             'latency_seconds': local_latency
             #         })
 
-            # --- FIXED: Create a new comparator instance for each account ---
-            output_report_file = os.path.join(run_output_path, f"coverage_report_{tenant_id}.csv")
-
-            # Create fresh comparator instance for this specific account
-            comparator = PredictionComparator(
-                gt_json_path=ground_truth_file,
-                exhaustive_fields=exhaustive_field_list
-            )
-
-            # Use the new single prediction comparison method
-            comparator.compare_single_prediction(prediction_file_path, output_report_file)
-
-            if os.path.exists(output_report_file):
-                df = pd.read_csv(output_report_file)
-                df.insert(0, 'tenantId', tenant_id)
-                df.insert(1, 'accountStructureFile', account_filename)
-                all_tenants_report_data.append(df)
-
-                # Calculate metrics for this tenant
-                metrics = calculate_metrics_from_csv(output_report_file)
-                metrics['tenantId'] = tenant_id
-                metrics['accountStructureFile'] = account_filename
-                metrics['fileTypeId'] = file_type_id
-                metrics['integrationId'] = integration_id
-                metrics['prediction_latency_seconds'] = prediction_latency
-                all_tenants_metrics_data.append(metrics)
-
-    # --- Step 5: Create Consolidated Report ---
-        if all_tenants_report_data:
-            print("\n" + "=" * 70)
-            print("Creating Consolidated Report...")
-            print("=" * 70)
-            consolidated_df = pd.concat(all_tenants_report_data, ignore_index=True)
-            consolidated_report_path = os.path.join(BASE_OUTPUT_FOLDER, file_type_id, "consolidated_report.csv")
-            consolidated_df.to_csv(consolidated_report_path, index=False)
-            print(f"✅ Consolidated report for {len(all_tenants_report_data)} tenants saved to: {consolidated_report_path}")
+            # --- Step 4b: Compare the tenants in chunks, so most reports survive a later failure ---
+            pending_runs.append({
+                'tenantId': tenant_id,
+                'accountStructureFile': account_filename,
+                'fileTypeId': file_type_id,
+                'integrationId': integration_id,
+                'prediction_latency_seconds': prediction_latency,
+                'gt_path': ground_truth_file,
+                'prediction_path': prediction_file_path,
+            })
+            if len(pending_runs) >= EVALUATION_CHUNK_SIZE:
+                status_frames.append(evaluate_tenant_chunk(comparator, pending_runs, consolidated_writer,
+                                                           dataset_writer, summary_groups, all_tenants_metrics_data))
+                pending_runs = []
+
+        if pending_runs:
+            status_frames.append(evaluate_tenant_chunk(comparator, pending_runs, consolidated_writer,
+                                                       dataset_writer, summary_groups, all_tenants_metrics_data))
+
+    # --- Step 5: Finish the Consolidated Report ---
+        consolidated_writer.close()
+        if dataset_writer:
+            dataset_writer.close()
+        if consolidated_writer.tenants_written:
+            print(f"\n✅ Consolidated report for {consolidated_writer.tenants_written} tenants "
+                  f"({consolidated_writer.rows_written} rows) saved to: {consolidated_writer.path}")
+            if dataset_writer:
+                print(f"✅ Consolidated report dataset saved to: {dataset_writer.path}")
 
         # --- Step 6: Create Metrics Summary Report ---
         if all_tenants_metrics_data:
             print("\n" + "=" * 70)
             print("Creating Metrics Summary Report...")
             print("=" * 70)
+            status_df = pd.concat(status_frames, ignore_index=True)
+            file_type_metrics = compute_metrics(status_df, summary_groups)['global'].iloc[0]
 
             # Create a summary DataFrame with key metrics
             metrics_summary = []
@@ -951,6 +1038,12 @@ def main():
             metrics_report_path = os.path.join(BASE_OUTPUT_FOLDER, file_type_id, "metrics_summary.csv")
             metrics_df.to_csv(metrics_report_path, index=False)
             print(f"✅ Metrics summary for {len(all_tenants_metrics_data)} tenants saved to: {metrics_report_path}")
+            if REPORT_OUTPUT_FORMAT == "parquet":
+                # The dataset keeps the extra fields as a list column instead of a '; '-joined string
+                metrics_dataset_df = metrics_df.assign(
+                    extra_fields_list=[list(m['extra_fields_list']) for m in all_tenants_metrics_data])
+                write_report_dataset(metrics_dataset_df, REPORT_DATASET_FOLDER, "metrics_summary",
+                                     file_type_id, timestamp)
 
             # Create separate latency report
             if all_latency_data:
@@ -958,11 +1051,14 @@ def main():
                 latency_report_path = os.path.join(BASE_OUTPUT_FOLDER, file_type_id, "latency_report.csv")
                 latency_df.to_csv(latency_report_path, index=False)
                 print(f"✅ Latency report for {len(all_latency_data)} API calls saved to: {latency_report_path}")
+                if REPORT_OUTPUT_FORMAT == "parquet":
+                    write_report_dataset(latency_df, REPORT_DATASET_FOLDER, "latency_report",
+                                         file_type_id, timestamp)
 
             # Print summary statistics
             if len(metrics_summary) > 0:
-                avg_coverage = metrics_df['coverage'].mean()
-                avg_accuracy = metrics_df['accuracy'].mean()
+                avg_coverage = file_type_metrics['mean_coverage']
+                avg_accuracy = file_type_metrics['mean_accuracy']
                 avg_latency = metrics_df['prediction_latency_seconds'].mean()
                 total_extra_fields = metrics_df['extra_fields_count'].sum()
                 print(f"\n📊 Summary Statistics:")
@@ -970,6 +1066,48 @@ def main():
                 print(f"   Average Accuracy: {avg_accuracy:.4f}")
                 print(f"   Average Prediction Latency: {avg_latency:.4f} seconds")
                 print(f"   Total Extra Fields Predicted: {total_extra_fields}")
+                print(f"   Pooled Coverage (all fields): {file_type_metrics['coverage']:.4f}")
+                print(f"   Pooled Accuracy (all fields): {file_type_metrics['accuracy']:.4f}")
+                for level in ("tenant", "field"):
+                    ci = bootstrap_ci(status_df, level=level, seed=0, group_columns=summary_groups).iloc[0]
+                    print(f"   {DEFAULT_CONFIDENCE:.0%} CI ({level} bootstrap): "
+                          f"coverage [{ci['coverage_low']:.4f}, {ci['coverage_high']:.4f}], "
+                          f"accuracy [{ci['accuracy_low']:.4f}, {ci['accuracy_high']:.4f}]")
+
+            if run_store:
+                run_store.record_file_type(timestamp, file_type_id, all_tenants_metrics_data, all_latency_data)
+                print(f"✅ Run {timestamp} recorded in the run store: {RUN_STORE_PATH}")
+
+            # Per-field leaderboard across the fileType's tenants, worst fields first
+            catalog = load_field_catalog(instances_json_path, store_table=field_store_table)
+            leaderboard_df = field_leaderboard(status_df, catalog=catalog)
+            leaderboard_path = os.path.join(BASE_OUTPUT_FOLDER, file_type_id, "field_leaderboard.csv")
+            leaderboard_df.to_csv(leaderboard_path, index=False)
+            print(f"✅ Field leaderboard for {len(leaderboard_df)} fields saved to: {leaderboard_path}")
+            if REPORT_OUTPUT_FORMAT == "parquet":
+                write_report_dataset(leaderboard_df, REPORT_DATASET_FOLDER, "field_leaderboard",
+                                     file_type_id, timestamp)
+            print(f"\n📊 Least accurate fields:")
+            for row in leaderboard_df.head(5).itertuples():
+                print(f"   {row.rank}. {row.FieldName}: error rate {row.error_rate:.2%}, "
+                      f"accuracy {row.accuracy:.4f}, judged by rules/LLM {row.judged}x")
+            rare_errors = leaderboard_df[leaderboard_df['rare'] & (leaderboard_df['error_rate'] > 0)]
+            if not rare_errors.empty:
+                print(f"   ⚠️ {len(rare_errors)} rarely used fields (in < {RARE_FIELD_TENANT_FRACTION:.0%} of tenants) "
+                      f"have errors: {', '.join(rare_errors['FieldName'].head(10))}")
+
+    if wait_for_report_writes():
+        print("⚠️ Some comparison reports could not be written; see the errors above.")
+
+    if llm_cache:
+        cache_stats = llm_cache.stats()
+        print(f"\n📊 LLM Verdict Cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+              f"(hit rate {cache_stats['hit_rate']:.1%}, {cache_stats['entries']} cached verdicts)")
+        llm_cache.close()
+
+    if run_store:
+        run_store.close()
+        print(f"\n🔄 Compare against an earlier run with: python run_store.py compare <baseline_run_id> {timestamp}")
 
     print("\n" + "=" * 70)
     print("🎉 Full Pipelining Workflow Complete!")
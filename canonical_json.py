@@ -0,0 +1,129 @@
+"""
+Parse-once canonical form for the values compared by PredictionComparator.
+
+GT and predicted field values are usually strings, and many of them hold JSON
+(filters, benefit plans, toggle steps). Every GT/PR value is normalized once
+into a CanonicalValue holding:
+    text    the stripped string form (what the exact-match check compares)
+    kind    "object" / "array" for JSON-bearing strings, "text" otherwise
+    parsed  the parsed JSON object (None for "text")
+    digest  an order-insensitive structural hash, computed lazily (see below)
+
+The structural hash sorts object keys and, by default, treats every JSON list
+as a multiset: element hashes are sorted before they are combined, so two
+values hash equal exactly when they are deeply equal up to key order and list
+order. Lists under keys in ORDERED_LIST_KEYS keep their order instead. Hashing
+is O(n log n) in the size of the value and works for arbitrarily nested
+structures such as the tables/selectedFieldValues lists in benefit plans.
+
+Canonical values are cached by text, so the same string is parsed at most once
+per process no matter how many matchers, iterations or tenants look at it.
+Callers must treat 'parsed' as read-only because it is shared through the cache.
+"""
+
+import hashlib
+from functools import lru_cache
+from typing import Any, FrozenSet, Iterable, Optional
+
+import json_codec
+
+KIND_OBJECT = "object"
+KIND_ARRAY = "array"
+KIND_TEXT = "text"
+
+CANONICAL_CACHE_SIZE = 65536
+
+# Keys whose list values are compared in order rather than as multisets
+ORDERED_LIST_KEYS: FrozenSet[str] = frozenset()
+
+
+class CanonicalValue:
+    """A field value parsed once into its type tag, parsed JSON and canonical hash."""
+
+    __slots__ = ("text", "kind", "parsed", "_digest")
+
+    def __init__(self, text: str, kind: str, parsed: Any = None):
+        self.text = text
+        self.kind = kind
+        self.parsed = parsed
+        self._digest: Optional[str] = None
+
+    @property
+    def is_json(self) -> bool:
+        return self.kind != KIND_TEXT
+
+    @property
+    def digest(self) -> str:
+        if self._digest is None:
+            raw = structural_digest(self.parsed) if self.is_json else _hash(b"s" + self.text.encode("utf-8"))
+            self._digest = raw.hex()
+        return self._digest
+
+    def __repr__(self) -> str:
+        return f"CanonicalValue(kind={self.kind!r}, text={self.text[:40]!r})"
+
+
+def _hash(data: bytes) -> bytes:
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def structural_digest(obj: Any, parent_key: Optional[str] = None) -> bytes:
+    """
+    Order-insensitive hash of a parsed JSON value: object keys are sorted and lists
+    are hashed as multisets unless their key is in ORDERED_LIST_KEYS.
+    Numbers hash by value, so 1 and 1.0 are equal (as with ==).
+    """
+    if isinstance(obj, dict):
+        members = sorted(_hash(b"k" + str(key).encode("utf-8")) + structural_digest(value, key)
+                         for key, value in obj.items())
+        return _hash(b"{" + b"".join(members))
+    if isinstance(obj, list):
+        elements = [structural_digest(item, parent_key) for item in obj]
+        if parent_key not in ORDERED_LIST_KEYS:
+            elements.sort()
+        return _hash(b"[" + b"".join(elements))
+    if obj is None:
+        return _hash(b"z")
+    if isinstance(obj, bool):
+        return _hash(b"b1" if obj else b"b0")
+    if isinstance(obj, (int, float)):
+        if isinstance(obj, float) and obj.is_integer():
+            obj = int(obj)
+        return _hash(b"n" + repr(obj).encode("ascii"))
+    return _hash(b"s" + str(obj).encode("utf-8"))
+
+
+def json_deep_equal(gt: CanonicalValue, pr: CanonicalValue) -> bool:
+    """True when two JSON-bearing values are deeply equal up to key order and multiset list order."""
+    return gt.is_json and gt.kind == pr.kind and gt.digest == pr.digest
+
+
+def set_ordered_list_keys(keys: Iterable[str]) -> None:
+    """Configures which keys keep list order; clears cached canonical values."""
+    global ORDERED_LIST_KEYS
+    ORDERED_LIST_KEYS = frozenset(keys)
+    _canonicalize_text.cache_clear()
+
+
+@lru_cache(maxsize=CANONICAL_CACHE_SIZE)
+def _canonicalize_text(text: str) -> CanonicalValue:
+    if text.startswith(("{", "[")):
+        try:
+            parsed = json_codec.loads(text)
+        except (json_codec.JSONDecodeError, TypeError):
+            return CanonicalValue(text, KIND_TEXT)
+        if isinstance(parsed, dict):
+            return CanonicalValue(text, KIND_OBJECT, parsed)
+        if isinstance(parsed, list):
+            return CanonicalValue(text, KIND_ARRAY, parsed)
+    return CanonicalValue(text, KIND_TEXT)
+
+
+def canonicalize(value: Any) -> CanonicalValue:
+    """Returns the (cached) canonical form of a GT or predicted field value."""
+    return _canonicalize_text(str(value).strip())
+
+
+def cache_info():
+    """Hit/miss statistics of the canonical value cache."""
+    return _canonicalize_text.cache_info()
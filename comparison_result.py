@@ -0,0 +1,119 @@
+"""
+Typed, columnar result of comparing one prediction against its ground truth.
+
+PredictionComparator used to write coverage_report_<tenant>.csv and main() read
+it back (twice) to compute metrics. ComparisonResult keeps the report in memory
+as parallel columns, with the status stored as small integer codes; its metrics
+come from metrics_calc (compute_metrics accepts a ComparisonResult directly).
+The CSV is just an optional sink and can be written on a background thread
+(call wait_for_report_writes() before the files are needed).
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from field_matchers import STATUS_MATCH, STATUS_MISMATCH, STATUS_PR_ABSENT, STATUS_GT_ABSENT, STATUS_BOTH_ABSENT
+
+# Status code i is STATUS_ORDER[i]; -1 marks an unknown status label
+STATUS_ORDER = (STATUS_MATCH, STATUS_MISMATCH, STATUS_PR_ABSENT, STATUS_GT_ABSENT, STATUS_BOTH_ABSENT)
+STATUS_COUNT_KEYS = (
+    'gt_present_pr_present_match',
+    'gt_present_pr_present_mismatch',
+    'gt_present_pr_absent',
+    'gt_absent_pr_present',
+    'gt_absent_pr_absent',
+)
+_STATUS_CODES = {status: code for code, status in enumerate(STATUS_ORDER)}
+
+_REPORT_WRITER = ThreadPoolExecutor(max_workers=2, thread_name_prefix="report-writer")
+_PENDING_WRITES: List[Future] = []
+
+
+def encode_statuses(statuses: Sequence[str]) -> np.ndarray:
+    return np.fromiter((_STATUS_CODES.get(s, -1) for s in statuses), dtype=np.int8, count=len(statuses))
+
+
+@dataclass
+class ComparisonResult:
+    """One comparison report as columns: FieldName, Ground_Truth_Value, Predicted_Value, Status, Match_Type."""
+
+    field_names: List[str]
+    gt_values: List[str]
+    pr_values: List[str]
+    status_codes: np.ndarray
+    match_types: List[str]
+    version: int = 1
+
+    @classmethod
+    def from_statuses(cls, field_names: List[str], gt_values: List[str], pr_values: List[str],
+                      statuses: Sequence[str], match_types: Sequence[str], version: int = 1) -> "ComparisonResult":
+        return cls(list(field_names), list(gt_values), list(pr_values), encode_statuses(statuses),
+                   list(match_types), version)
+
+    @classmethod
+    def from_csv(cls, csv_file_path: str, version: int = 1) -> "ComparisonResult":
+        """Loads a coverage report CSV (Status_v<version>, falling back to Status)."""
+        df = pd.read_csv(csv_file_path, keep_default_na=False, dtype=str)
+        suffix = f"_v{version}"
+        status_col = f'Status{suffix}' if f'Status{suffix}' in df.columns else 'Status'
+        match_col = f'Match_Type{suffix}' if f'Match_Type{suffix}' in df.columns else 'Match_Type'
+        pr_col = f'Predicted_Value{suffix}' if f'Predicted_Value{suffix}' in df.columns else 'Predicted_Value'
+        empty = [""] * len(df)
+        return cls.from_statuses(
+            df['FieldName'].tolist(),
+            df['Ground_Truth_Value'].tolist() if 'Ground_Truth_Value' in df.columns else empty,
+            df[pr_col].tolist() if pr_col in df.columns else empty,
+            df[status_col].tolist(),
+            df[match_col].tolist() if match_col in df.columns else empty,
+            version
+        )
+
+    def __len__(self) -> int:
+        return len(self.field_names)
+
+    @property
+    def statuses(self) -> np.ndarray:
+        labels = np.array(STATUS_ORDER + ("",), dtype=object)
+        return labels[self.status_codes]
+
+    def to_frame(self) -> pd.DataFrame:
+        v = self.version
+        return pd.DataFrame({
+            'FieldName': self.field_names,
+            'Ground_Truth_Value': self.gt_values,
+            f'Predicted_Value_v{v}': self.pr_values,
+            f'Status_v{v}': self.statuses,
+            f'Match_Type_v{v}': self.match_types,
+        })
+
+    def write_csv(self, output_csv_path: str, background: bool = False) -> Optional[Future]:
+        """Writes the coverage report CSV, optionally on the background report writer."""
+        if background:
+            future = _REPORT_WRITER.submit(_write_frame, self.to_frame(), output_csv_path)
+            _PENDING_WRITES.append(future)
+            return future
+        _write_frame(self.to_frame(), output_csv_path)
+        return None
+
+
+def _write_frame(df: pd.DataFrame, output_csv_path: str) -> bool:
+    try:
+        df.to_csv(output_csv_path, index=False)
+        print(f"✅ Comparison report saved to: {output_csv_path}")
+        return True
+    except Exception as e:
+        print(f"✗ Error writing to CSV file {output_csv_path}: {e}")
+        return False
+
+
+def wait_for_report_writes() -> int:
+    """Blocks until every background report write has finished; returns how many failed."""
+    failed = 0
+    while _PENDING_WRITES:
+        if not _PENDING_WRITES.pop().result():
+            failed += 1
+    return failed
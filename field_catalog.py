@@ -0,0 +1,143 @@
+"""
+Memoized field catalog for an instances.json file.
+
+Walking every instance's 'fileTransferFields' to build the exhaustive field list
+is repeated on every run and for every fileTypeId. This module does the walk
+once and caches the result in 'field_catalog.json' next to instances.json. The
+cache is keyed by the SHA-256 of the instances file's content, so it is rebuilt
+only when instances.json actually changes.
+
+For every field the catalog records:
+    occurrences      number of instances that carry the field
+    tenant_fraction  fraction of distinct tenants with at least one instance carrying the field
+    value_type       most common value type: null, bool, number, string, json_object, json_array
+
+When a current columnar field store exists (see field_store.py), a rebuild is
+computed from it instead of walking instances.json.
+
+The pipeline uses the field names as the exhaustive field list; the metadata is
+added to the per-field leaderboard, where 'rare' marks fields carried by fewer
+than RARE_FIELD_TENANT_FRACTION of the tenants.
+"""
+
+import hashlib
+import os
+from collections import Counter
+from typing import Any, Dict, Optional
+
+import json_codec
+from instances_reader import iter_instances
+
+CATALOG_FILENAME = "field_catalog.json"
+CATALOG_VERSION = 1
+RARE_FIELD_TENANT_FRACTION = 0.1
+
+
+def file_sha256(file_path: str, chunk_size: int = 1 << 20) -> str:
+    """Returns the hex SHA-256 of a file's content."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def value_type(value: Any) -> str:
+    """Classifies a field value; strings holding a JSON object or array are reported as such."""
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, (int, float)):
+        return "number"
+    if isinstance(value, dict):
+        return "json_object"
+    if isinstance(value, list):
+        return "json_array"
+    text = str(value).strip()
+    if text.startswith(("{", "[")):
+        try:
+            parsed = json_codec.loads(text)
+        except (json_codec.JSONDecodeError, TypeError):
+            return "string"
+        if isinstance(parsed, dict):
+            return "json_object"
+        if isinstance(parsed, list):
+            return "json_array"
+    return "string"
+
+
+def build_field_catalog(instances_json_path: str) -> Dict[str, Dict[str, Any]]:
+    """Walks instances.json once and returns {field_name: metadata} (field names keep their original case)."""
+    occurrences: Counter = Counter()
+    tenants_with_field: Dict[str, set] = {}
+    type_counts: Dict[str, Counter] = {}
+    all_tenants = set()
+
+    for integration in iter_instances(instances_json_path):
+        tenant_id = integration.get("tenantId")
+        all_tenants.add(tenant_id)
+        values: Dict[str, Any] = {}
+        for key, value in integration.items():
+            if key != "fileTransferFields":
+                values[key] = value
+        for field in integration.get("fileTransferFields") or []:
+            key = field.get("key")
+            if key:
+                values[key] = field.get("value")
+        for key, value in values.items():
+            occurrences[key] += 1
+            tenants_with_field.setdefault(key, set()).add(tenant_id)
+            type_counts.setdefault(key, Counter())[value_type(value)] += 1
+
+    total_tenants = len(all_tenants) or 1
+    return {
+        key: {
+            "occurrences": occurrences[key],
+            "tenant_fraction": round(len(tenants_with_field[key]) / total_tenants, 4),
+            "value_type": type_counts[key].most_common(1)[0][0],
+        }
+        for key in sorted(occurrences)
+    }
+
+
+def load_field_catalog(instances_json_path: str, use_cache: bool = True,
+                       store_table: Optional[Any] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Returns the field catalog for instances.json, reusing the on-disk cache when the
+    content hash matches and rebuilding (and re-caching) it otherwise. With the fileType's
+    rows from a current field store (field_store.load_current_field_store), the rebuild is
+    a columnar group-by instead of a walk over instances.json.
+    """
+    cache_path = os.path.join(os.path.dirname(instances_json_path), CATALOG_FILENAME)
+    content_hash = file_sha256(instances_json_path)
+
+    if use_cache and os.path.exists(cache_path):
+        try:
+            cached = json_codec.load(cache_path)
+            if cached.get("version") == CATALOG_VERSION and cached.get("instances_sha256") == content_hash:
+                print(f"   ✓ Using cached field catalog: {cache_path}")
+                return cached["fields"]
+        except (json_codec.JSONDecodeError, KeyError, OSError, AttributeError) as e:
+            print(f"   ⚠️ Warning: Ignoring unreadable field catalog cache {cache_path}. Error: {e}")
+
+    if store_table is not None:
+        # Imported here: field_store itself imports this module
+        from field_store import field_catalog_from_store
+        catalog = field_catalog_from_store(store_table)
+    else:
+        catalog = build_field_catalog(instances_json_path)
+    if use_cache:
+        _write_cache(cache_path, {"version": CATALOG_VERSION, "instances_sha256": content_hash, "fields": catalog})
+    return catalog
+
+
+def _write_cache(cache_path: str, payload: Dict[str, Any]) -> Optional[str]:
+    tmp_path = f"{cache_path}.tmp"
+    try:
+        json_codec.dump(payload, tmp_path)
+        os.replace(tmp_path, cache_path)
+        return cache_path
+    except OSError as e:
+        print(f"   ⚠️ Warning: Could not write field catalog cache {cache_path}. Error: {e}")
+        return None
@@ -0,0 +1,249 @@
+"""
+Registry of field-specific matchers used by PredictionComparator.
+
+A matcher decides whether a GT/predicted pair that is not an exact string match
+should count as a match. It is bound to a field-name pattern (fnmatch style,
+case-insensitive, e.g. "toggle-*", "*Filters") and, optionally, to a single
+fileTypeId. Its signature is:
+
+    matcher(field_name, gt: CanonicalValue, pr: CanonicalValue) -> Optional[(status, match_type)]
+
+Returning None means "no decision" and passes the pair on to the next rule, and
+eventually to the comparator's generic fallbacks (JSON deep equality, then the LLM).
+
+Besides the registry, structural_partial_matcher scores any remaining pair of
+JSON values by the overlap of their leaves; the comparator runs it after JSON deep
+equality so that only unstructured values still need the LLM.
+
+The registry compiles its patterns once and memoizes the matcher chain for every
+(fileTypeId, field) it has seen, so dispatch is a dict lookup per field.
+fileTypeId-specific rules run before generic ones; within each group rules run in
+registration order.
+"""
+
+import re
+from fnmatch import translate
+from functools import lru_cache
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+from canonical_json import CanonicalValue, canonicalize, KIND_ARRAY, KIND_OBJECT, KIND_TEXT
+
+# Comparison status labels written to the Status_v* report columns
+STATUS_MATCH = "GT Present PR Present and match"
+STATUS_MISMATCH = "GT Present PR Present but mismatch"
+STATUS_PR_ABSENT = "GT Present PR Absent"
+STATUS_GT_ABSENT = "GT Absent PR Present"
+STATUS_BOTH_ABSENT = "GT Absent PR Absent"
+
+MatchResult = Optional[Tuple[str, str]]
+Matcher = Callable[[str, CanonicalValue, CanonicalValue], MatchResult]
+
+
+class MatcherRegistry:
+    """Field-pattern → matcher rules, compiled into a memoized dispatch table."""
+
+    def __init__(self):
+        self._rules: List[Tuple[str, Optional[str], Matcher]] = []
+        self._compiled: Optional[List[Tuple[Any, Optional[str], Matcher]]] = None
+        self._dispatch: Dict[Tuple[Optional[str], str], Tuple[Matcher, ...]] = {}
+
+    def register(self, pattern: str, matcher: Matcher, file_type_id: Optional[str] = None) -> Matcher:
+        """Binds a matcher to a field-name pattern, optionally only for one fileTypeId."""
+        self._rules.append((pattern, file_type_id, matcher))
+        self._compiled = None
+        self._dispatch.clear()
+        return matcher
+
+    def rule(self, pattern: str, file_type_id: Optional[str] = None) -> Callable[[Matcher], Matcher]:
+        """Decorator form of register()."""
+        return lambda matcher: self.register(pattern, matcher, file_type_id)
+
+    def _compile(self) -> List[Tuple[Any, Optional[str], Matcher]]:
+        # fileTypeId-specific rules first, then generic ones, each in registration order
+        ordered = [r for r in self._rules if r[1] is not None] + [r for r in self._rules if r[1] is None]
+        return [(re.compile(translate(pattern.lower())), file_type_id, matcher)
+                for pattern, file_type_id, matcher in ordered]
+
+    def matchers_for(self, field_name: str, file_type_id: Optional[str] = None) -> Tuple[Matcher, ...]:
+        """Returns the matcher chain for a (lower-cased) field name."""
+        key = (file_type_id, field_name)
+        chain = self._dispatch.get(key)
+        if chain is None:
+            if self._compiled is None:
+                self._compiled = self._compile()
+            chain = tuple(matcher for regex, rule_file_type, matcher in self._compiled
+                          if (rule_file_type is None or rule_file_type == file_type_id)
+                          and regex.match(field_name.lower()))
+            self._dispatch[key] = chain
+        return chain
+
+    def match(self, field_name: str, gt: CanonicalValue, pr: CanonicalValue,
+              file_type_id: Optional[str] = None) -> MatchResult:
+        """Runs the matcher chain for a field and returns the first decision, or None."""
+        for matcher in self.matchers_for(field_name, file_type_id):
+            result = matcher(field_name, gt, pr)
+            if result is not None:
+                return result
+        return None
+
+
+# ==============================================================================
+# --- BUILT-IN MATCHERS ---
+# ==============================================================================
+
+def toggle_hidden_matcher(field_name: str, gt: CanonicalValue, pr: CanonicalValue) -> MatchResult:
+    """Toggle steps only need to agree on 'hidden'."""
+    if gt.kind == KIND_OBJECT and pr.kind == KIND_OBJECT and 'hidden' in gt.parsed and 'hidden' in pr.parsed:
+        if gt.parsed['hidden'] == pr.parsed['hidden']:
+            return STATUS_MATCH, "toggle_match_hidden_only"
+        return STATUS_MISMATCH, "incorrect_toggle_hidden_mismatch"
+    return None
+
+
+def _filter_sets(value: Any) -> Optional[Dict[str, frozenset]]:
+    if not isinstance(value, list):
+        return None
+    sources: Dict[str, set] = {}
+    for item in value:
+        if not isinstance(item, dict) or 'source' not in item:
+            return None
+        values = item.get('values') or []
+        if not isinstance(values, list):
+            values = [values]
+        sources.setdefault(str(item['source']), set()).update(str(v) for v in values)
+    return {source: frozenset(values) for source, values in sources.items()}
+
+
+def filters_matcher(field_name: str, gt: CanonicalValue, pr: CanonicalValue) -> MatchResult:
+    """[{source, values}] filters match when every source selects the same set of values."""
+    if gt.kind != KIND_ARRAY or pr.kind != KIND_ARRAY:
+        return None
+    gt_filters, pr_filters = _filter_sets(gt.parsed), _filter_sets(pr.parsed)
+    if gt_filters is not None and gt_filters == pr_filters:
+        return STATUS_MATCH, "filter_match"
+    return None
+
+
+def _plan_signature(value: Any) -> Optional[frozenset]:
+    if not isinstance(value, list):
+        return None
+    plans = []
+    for plan in value:
+        if not isinstance(plan, dict):
+            return None
+        tables = []
+        for table in plan.get('tables') or []:
+            if not isinstance(table, dict):
+                return None
+            selected = frozenset(str(v.get('value')) for v in table.get('selectedFieldValues') or []
+                                 if isinstance(v, dict))
+            tables.append((str(table.get('name')), selected))
+        plans.append((str(plan.get('value')), frozenset(tables)))
+    return frozenset(plans)
+
+
+def benefit_plan_matcher(field_name: str, gt: CanonicalValue, pr: CanonicalValue) -> MatchResult:
+    """Benefit plans match on plan values and selected table codes; display descriptions are ignored."""
+    if gt.kind != KIND_ARRAY or pr.kind != KIND_ARRAY:
+        return None
+    gt_plans, pr_plans = _plan_signature(gt.parsed), _plan_signature(pr.parsed)
+    if gt_plans is not None and gt_plans == pr_plans:
+        return STATUS_MATCH, "benefit_plan_match"
+    return None
+
+
+# A clean plan-type code: one short alphanumeric token such as "N", "V" or "PPO"
+PLAN_TYPE_CODE_RE = re.compile(r"^[A-Za-z0-9_]{1,16}$")
+
+
+def plan_type_code_matcher(field_name: str, gt: CanonicalValue, pr: CanonicalValue) -> MatchResult:
+    """
+    Plan types are single codes: a case-insensitive match is decided here, and so is a
+    mismatch between two clean codes. Anything else (e.g. "PPO" vs "PPO-HSA") is left
+    to the later stages.
+    """
+    if gt.kind != KIND_TEXT or pr.kind != KIND_TEXT or not gt.text or not pr.text:
+        return None
+    gt_code, pr_code = gt.text.strip(), pr.text.strip()
+    if gt_code.casefold() == pr_code.casefold():
+        return STATUS_MATCH, "code_match_casefold"
+    if PLAN_TYPE_CODE_RE.match(gt_code) and PLAN_TYPE_CODE_RE.match(pr_code):
+        return STATUS_MISMATCH, "incorrect"
+    return None
+
+
+# ==============================================================================
+# --- STRUCTURAL PARTIAL-MATCH SCORER ---
+# ==============================================================================
+
+# Display-only leaves that do not change the meaning of a configuration
+IGNORED_LEAF_KEYS = {"description"}
+PARTIAL_MATCH_METRICS = ("jaccard", "precision", "recall", "f1")
+DEFAULT_PARTIAL_MATCH_THRESHOLD = 0.8
+
+
+def _collect_leaves(obj: Any, path: str, leaves: set) -> None:
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            if key not in IGNORED_LEAF_KEYS:
+                _collect_leaves(value, f"{path}.{key}", leaves)
+    elif isinstance(obj, list):
+        for item in obj:
+            _collect_leaves(item, path, leaves)
+    elif obj is not None:
+        if isinstance(obj, float) and obj.is_integer():
+            obj = int(obj)
+        leaves.add((path, str(obj).strip().casefold()))
+
+
+@lru_cache(maxsize=65536)
+def _leaves_of(text: str) -> FrozenSet[Tuple[str, str]]:
+    leaves: set = set()
+    _collect_leaves(canonicalize(text).parsed, "", leaves)
+    return frozenset(leaves)
+
+
+def structural_leaves(value: CanonicalValue) -> FrozenSet[Tuple[str, str]]:
+    """
+    (key path, scalar) leaves of a JSON value, with list positions dropped, e.g.
+    ('.tables.selectedFieldValues.value', 'ee') or ('.values', 'active').
+    """
+    return _leaves_of(value.text) if value.is_json else frozenset()
+
+
+def overlap_scores(gt: CanonicalValue, pr: CanonicalValue) -> Dict[str, float]:
+    """Jaccard, precision, recall and F1 of the predicted leaves against the GT leaves."""
+    gt_leaves, pr_leaves = structural_leaves(gt), structural_leaves(pr)
+    common = len(gt_leaves & pr_leaves)
+    union = len(gt_leaves | pr_leaves)
+    precision = common / len(pr_leaves) if pr_leaves else 0.0
+    recall = common / len(gt_leaves) if gt_leaves else 0.0
+    return {
+        "jaccard": common / union if union else 0.0,
+        "precision": precision,
+        "recall": recall,
+        "f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+    }
+
+
+def structural_partial_matcher(field_name: str, gt: CanonicalValue, pr: CanonicalValue,
+                               threshold: float = DEFAULT_PARTIAL_MATCH_THRESHOLD,
+                               metric: str = "jaccard") -> MatchResult:
+    """
+    Local replacement for the LLM's partial-match judgement. Emits the LLM's match
+    types: 'json_partial_correct' when the leaf overlap reaches the threshold,
+    'incorrect' otherwise. Returns None when either side is not structured JSON
+    (including a blank prediction), leaving the pair to the LLM.
+    """
+    if not (gt.is_json and pr.is_json) or not structural_leaves(gt):
+        return None
+    if overlap_scores(gt, pr)[metric] >= threshold:
+        return STATUS_MATCH, "json_partial_correct"
+    return STATUS_MISMATCH, "incorrect"
+
+
+DEFAULT_REGISTRY = MatcherRegistry()
+DEFAULT_REGISTRY.register("toggle-*", toggle_hidden_matcher)
+DEFAULT_REGISTRY.register("*filters", filters_matcher)
+DEFAULT_REGISTRY.register("*benefitplan", benefit_plan_matcher)
+DEFAULT_REGISTRY.register("*plantype", plan_type_code_matcher)
@@ -0,0 +1,330 @@
+"""
+Columnar field store for all priority_integration_data/*/instances.json files.
+
+Flattens every integration instance into one row per field, with columns:
+    fileTypeId, tenantId, integrationId, instance_index, field_key, raw_value, is_top_level, raw_is_json
+
+'instance_index' is the instance's position in its instances.json and 'is_top_level'
+marks keys that sit directly on the instance rather than inside 'fileTransferFields'.
+Non-string values are stored JSON-encoded with 'raw_is_json' set, and nulls stay null.
+The table is written as Parquet or as an Arrow IPC stream, with fileTypeId and
+field_key dictionary-encoded. The SHA-256 of every source instances.json is kept in
+the schema metadata, so a fileType's rows are only used while its instances.json is
+unchanged.
+
+When the store is current, the pipeline reads a fileType's rows with
+load_current_field_store() and both ground-truth extraction (find_instance_in_store)
+and field catalogs (field_catalog_from_store) become Arrow filters and group-bys
+instead of walking the nested 'fileTransferFields' lists. corpus_stats() gives
+per-fileTypeId statistics over the whole corpus.
+
+Build the store (requires 'pyarrow'):
+    python field_store.py                    # -> priority_integration_data/field_store.parquet
+    python field_store.py --format arrow     # -> priority_integration_data/field_store.arrow
+    python field_store.py --stats            # build, then print per-fileTypeId statistics
+"""
+
+import argparse
+import glob
+import os
+from typing import Any, Dict, Iterator, List, Optional
+
+import json_codec
+from field_catalog import file_sha256, value_type
+from instances_reader import iter_instances
+
+# --- Library Setup ---
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_INSTANCES_FOLDER = os.path.join(SCRIPT_DIR, "priority_integration_data")
+
+COLUMNS = ["fileTypeId", "tenantId", "integrationId", "instance_index", "field_key", "raw_value", "is_top_level",
+           "raw_is_json"]
+BATCH_ROWS = 1 << 16  # field rows per record batch (and Parquet row group)
+HASHES_METADATA_KEY = b"instances_sha256"
+
+
+def _schema(hashes: Optional[Dict[str, str]] = None) -> "pa.Schema":
+    schema = pa.schema([
+        ("fileTypeId", pa.dictionary(pa.int32(), pa.string())),
+        ("tenantId", pa.string()),
+        ("integrationId", pa.string()),
+        ("instance_index", pa.int64()),
+        ("field_key", pa.dictionary(pa.int32(), pa.string())),
+        ("raw_value", pa.large_string()),
+        ("is_top_level", pa.bool_()),
+        ("raw_is_json", pa.bool_()),
+    ])
+    if hashes is not None:
+        schema = schema.with_metadata({HASHES_METADATA_KEY: json_codec.dumps(hashes)})
+    return schema
+
+
+def _encode_value(value: Any) -> tuple:
+    """Returns (raw_value, raw_is_json) for a field value."""
+    if value is None:
+        return None, False
+    if isinstance(value, str):
+        return value, False
+    return json_codec.dumps(value), True
+
+
+def _decode_value(raw: Optional[str], is_json: bool) -> Any:
+    return json_codec.loads(raw) if is_json else raw
+
+
+def iter_field_rows(instances_json_path: str, file_type_id: str) -> Iterator[Dict[str, Any]]:
+    """Yields one flat row per field of every instance in an instances.json file."""
+    for instance_index, instance in enumerate(iter_instances(instances_json_path)):
+        tenant_id = instance.get("tenantId")
+        integration_id = instance.get("integrationId")
+        base = {"fileTypeId": file_type_id, "tenantId": tenant_id, "integrationId": integration_id,
+                "instance_index": instance_index}
+        for key, value in instance.items():
+            if key == "fileTransferFields":
+                continue
+            raw, is_json = _encode_value(value)
+            yield {**base, "field_key": key, "raw_value": raw, "is_top_level": True, "raw_is_json": is_json}
+        for field in instance.get("fileTransferFields") or []:
+            key = field.get("key")
+            if not key:
+                continue
+            raw, is_json = _encode_value(field.get("value"))
+            yield {**base, "field_key": key, "raw_value": raw, "is_top_level": False, "raw_is_json": is_json}
+
+
+def _rows_to_batch(rows: List[Dict[str, Any]], schema: "pa.Schema") -> "pa.RecordBatch":
+    columns = {name: [row[name] for row in rows] for name in COLUMNS}
+    return pa.RecordBatch.from_pydict(columns, schema=schema)
+
+
+def _iter_batches(rows: Iterator[Dict[str, Any]], schema: "pa.Schema",
+                  batch_rows: int = BATCH_ROWS) -> Iterator["pa.RecordBatch"]:
+    """Groups a row iterator into record batches of at most batch_rows rows."""
+    chunk: List[Dict[str, Any]] = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= batch_rows:
+            yield _rows_to_batch(chunk, schema)
+            chunk = []
+    if chunk:
+        yield _rows_to_batch(chunk, schema)
+
+
+def build_field_store(instances_folder: str = BASE_INSTANCES_FOLDER, output_path: Optional[str] = None,
+                      fmt: str = "parquet", batch_rows: int = BATCH_ROWS) -> Optional[str]:
+    """
+    Converts every <instances_folder>/<fileTypeId>/instances.json into one columnar file.
+    Rows are streamed from the instances reader in record batches of batch_rows rows, so
+    memory is bounded by the batch size rather than by the size of a fileTypeId.
+    Returns the output path, or None on failure (no partial store is left behind).
+    """
+    if not PYARROW_AVAILABLE:
+        print("✗ The 'pyarrow' package is required to build the field store.")
+        return None
+    if fmt not in ("parquet", "arrow"):
+        print(f"✗ Unknown field store format '{fmt}'. Use 'parquet' or 'arrow'.")
+        return None
+
+    output_path = output_path or os.path.join(instances_folder, f"field_store.{fmt}")
+    instance_files = sorted(glob.glob(os.path.join(instances_folder, "*", "instances.json")))
+    if not instance_files:
+        print(f"✗ No instances.json files found under '{instances_folder}'.")
+        return None
+
+    print(f"\n🗄️ Building {fmt} field store from {len(instance_files)} instances.json files...")
+    file_type_ids = [os.path.basename(os.path.dirname(path)) for path in instance_files]
+    schema = _schema({ft: file_sha256(path) for ft, path in zip(file_type_ids, instance_files)})
+    tmp_path = f"{output_path}.tmp"
+    # The IPC stream format (unlike the IPC file format) allows each batch to carry its own dictionaries
+    writer = pq.ParquetWriter(tmp_path, schema) if fmt == "parquet" else pa.ipc.new_stream(tmp_path, schema)
+    total_rows = 0
+    try:
+        for file_type_id, instances_json_path in zip(file_type_ids, instance_files):
+            file_type_rows = 0
+            for batch in _iter_batches(iter_field_rows(instances_json_path, file_type_id), schema, batch_rows):
+                writer.write_batch(batch)
+                file_type_rows += batch.num_rows
+            total_rows += file_type_rows
+            print(f"   ✓ {file_type_id}: {file_type_rows} field rows")
+        writer.close()
+    except Exception as e:
+        writer.close()
+        os.remove(tmp_path)
+        print(f"✗ Could not build the field store from {instances_json_path}. Error: {e}")
+        return None
+    os.replace(tmp_path, output_path)
+
+    print(f"✅ Field store with {total_rows} rows saved to: {output_path}")
+    return output_path
+
+
+def store_hashes(store_path: str) -> Dict[str, str]:
+    """Returns the {fileTypeId: instances.json SHA-256} the store was built from."""
+    if store_path.endswith(".parquet"):
+        schema = pq.read_schema(store_path)
+    else:
+        with pa.ipc.open_stream(store_path) as reader:
+            schema = reader.schema
+    return json_codec.loads((schema.metadata or {}).get(HASHES_METADATA_KEY, b"{}"))
+
+
+def load_field_store(store_path: str, file_type_id: Optional[str] = None) -> "pa.Table":
+    """
+    Loads a field store written by build_field_store (format is picked from the extension).
+    With a file_type_id only that fileType's rows are returned; Parquet skips the other row groups.
+    """
+    if store_path.endswith(".parquet"):
+        filters = [("fileTypeId", "=", file_type_id)] if file_type_id is not None else None
+        return pq.read_table(store_path, filters=filters)
+    with pa.ipc.open_stream(store_path) as reader:
+        table = reader.read_all()
+    return table.filter(_equals(table, "fileTypeId", file_type_id)) if file_type_id is not None else table
+
+
+def load_current_field_store(store_path: str, file_type_id: str, instances_json_path: str) -> Optional["pa.Table"]:
+    """
+    Returns the fileType's rows if the store exists and was built from the current instances.json,
+    otherwise None (callers then read instances.json directly).
+    """
+    if not PYARROW_AVAILABLE or not os.path.exists(store_path):
+        return None
+    try:
+        if store_hashes(store_path).get(file_type_id) != file_sha256(instances_json_path):
+            print(f"   ⚠️ Field store {store_path} is out of date for {file_type_id}; reading instances.json.")
+            return None
+        table = load_field_store(store_path, file_type_id)
+    except Exception as e:
+        print(f"   ⚠️ Warning: Could not read field store {store_path}. Error: {e}")
+        return None
+    print(f"   ✓ Using field store for {file_type_id}: {table.num_rows} field rows")
+    return table
+
+
+def _equals(table: "pa.Table", column: str, value: str) -> "pa.ChunkedArray":
+    return pc.equal(table[column].cast(pa.string()), value)
+
+
+def find_instance_in_store(table: "pa.Table", tenant_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Rebuilds a tenant's first instance (the one instances_reader.find_instance returns) from a
+    fileType's rows. fileTransferFields entries come back as {'key', 'value'} pairs.
+    """
+    rows = table.filter(pc.equal(table["tenantId"], tenant_id))
+    if rows.num_rows == 0:
+        return None
+    first_instance = pc.min(rows["instance_index"])
+    rows = rows.filter(pc.equal(rows["instance_index"], first_instance)).to_pydict()
+
+    instance: Dict[str, Any] = {}
+    transfer_fields: List[Dict[str, Any]] = []
+    for key, raw, is_top, is_json in zip(rows["field_key"], rows["raw_value"], rows["is_top_level"],
+                                         rows["raw_is_json"]):
+        value = _decode_value(raw, is_json)
+        if is_top:
+            instance[key] = value
+        else:
+            transfer_fields.append({"key": key, "value": value})
+    instance["fileTransferFields"] = transfer_fields
+    return instance
+
+
+def field_catalog_from_store(table: "pa.Table") -> Dict[str, Dict[str, Any]]:
+    """
+    The field catalog of a fileType's rows, in field_catalog.build_field_catalog's format
+    (occurrences, tenant_fraction, value_type), computed with Arrow group-bys.
+    """
+    strings = table.select(["tenantId", "instance_index", "field_key", "raw_value", "raw_is_json"]) \
+        .cast(pa.schema([("tenantId", pa.string()), ("instance_index", pa.int64()), ("field_key", pa.string()),
+                         ("raw_value", pa.large_string()), ("raw_is_json", pa.bool_())]))
+    total_tenants = pc.count_distinct(strings["tenantId"], mode="all").as_py() or 1
+
+    # One value per (instance, field); a later row wins, like the dict build_field_catalog fills
+    values = strings.group_by(["instance_index", "field_key"], use_threads=False).aggregate([
+        ("tenantId", "last"), ("raw_value", "last"), ("raw_is_json", "last"),
+    ]).rename_columns(["instance_index", "field_key", "tenantId", "raw_value", "raw_is_json"])
+    values = values.append_column("value_type", _value_types(values["raw_value"], values["raw_is_json"]))
+
+    fields = values.group_by("field_key").aggregate([
+        ("instance_index", "count"),
+        ("tenantId", "count_distinct", pc.CountOptions(mode="all")),
+    ]).to_pydict()
+    # Most common value type per field; ties go to the type seen first, as with Counter.most_common
+    types = values.group_by(["field_key", "value_type"]).aggregate([
+        ("instance_index", "count"), ("instance_index", "min"),
+    ]).sort_by([("field_key", "ascending"), ("instance_index_count", "descending"),
+                ("instance_index_min", "ascending")]).to_pydict()
+    common_type: Dict[str, str] = {}
+    for key, kind in zip(types["field_key"], types["value_type"]):
+        common_type.setdefault(key, kind)
+
+    return {
+        key: {
+            "occurrences": occurrences,
+            "tenant_fraction": round(tenants / total_tenants, 4),
+            "value_type": common_type[key],
+        }
+        for key, occurrences, tenants in sorted(zip(fields["field_key"], fields["instance_index_count"],
+                                                     fields["tenantId_count_distinct"]))
+    }
+
+
+def _value_types(raw_values: "pa.ChunkedArray", raw_is_json: "pa.ChunkedArray") -> "pa.Array":
+    """field_catalog.value_type for stored values; only strings that look like JSON are decoded."""
+    first_char = pc.utf8_slice_codeunits(raw_values, 0, 1)
+    json_kind = pc.case_when(
+        pc.make_struct(pc.equal(first_char, "{"), pc.equal(first_char, "["),
+                       pc.is_in(first_char, pa.array(["t", "f"]))),
+        "json_object", "json_array", "bool", "number")
+    kinds = pc.if_else(raw_is_json, json_kind, "string")
+    kinds = pc.if_else(pc.is_null(raw_values), "null", kinds).to_pylist()
+
+    maybe_json = pc.and_(pc.invert(raw_is_json), pc.is_in(
+        pc.utf8_slice_codeunits(pc.utf8_ltrim_whitespace(raw_values), 0, 1), pa.array(["{", "["])))
+    for i in pc.indices_nonzero(pc.fill_null(maybe_json, False)).to_pylist():
+        kinds[i] = value_type(raw_values[i].as_py())
+    return pa.array(kinds, pa.string())
+
+
+def corpus_stats(table: "pa.Table") -> "pa.Table":
+    """Per fileTypeId: field rows, distinct fields, tenants and integrations."""
+    strings = table.select(["fileTypeId", "field_key", "tenantId", "integrationId"]).cast(pa.schema([
+        ("fileTypeId", pa.string()), ("field_key", pa.string()),
+        ("tenantId", pa.string()), ("integrationId", pa.string()),
+    ]))
+    stats = strings.group_by("fileTypeId").aggregate([
+        ("field_key", "count"),
+        ("field_key", "count_distinct"),
+        ("tenantId", "count_distinct"),
+        ("integrationId", "count_distinct"),
+    ])
+    stats = stats.select(["fileTypeId", "field_key_count", "field_key_count_distinct", "tenantId_count_distinct",
+                          "integrationId_count_distinct"])
+    stats = stats.rename_columns(["fileTypeId", "field_rows", "distinct_fields", "tenants", "integrations"])
+    return stats.sort_by("fileTypeId")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the columnar field store from all instances.json files.")
+    parser.add_argument("--instances-folder", default=BASE_INSTANCES_FOLDER)
+    parser.add_argument("--output", default=None, help="Output file (default: <instances-folder>/field_store.<fmt>)")
+    parser.add_argument("--format", choices=["parquet", "arrow"], default="parquet")
+    parser.add_argument("--stats", action="store_true", help="Print per-fileTypeId statistics after building")
+    args = parser.parse_args()
+
+    store_path = build_field_store(args.instances_folder, args.output, args.format)
+    if store_path and args.stats:
+        print("\n📊 Corpus statistics:")
+        print(corpus_stats(load_field_store(store_path)).to_pandas().to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
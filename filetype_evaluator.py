@@ -0,0 +1,99 @@
+"""
+Whole-fileType evaluation in one pass.
+
+Instead of one PredictionComparator run, CSV and metrics calculation per tenant
+followed by a pd.concat, every tenant of a fileTypeId is compared at once:
+
+    - ground truths and predictions are loaded once per tenant;
+    - a single (tenants x fields) status matrix is built with
+      multi_iteration.classify_matrix, so exact matches are vectorized and the
+      ambiguous residue is judged once per distinct (field, GT, prediction)
+      across all tenants (one batched LLM pass for the batch);
+    - metrics_calc (compute_metrics, field_leaderboard, bootstrap_ci) accepts
+      the resulting FileTypeEvaluation directly.
+
+A tenant's "scope" is the same field list the per-tenant comparator used:
+the fileType's exhaustive fields plus that tenant's GT and prediction fields,
+minus ignored fields. Cells outside a tenant's scope are not reported.
+"""
+
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+from comparison_result import ComparisonResult
+from multi_iteration import DecideFn, classify_matrix, format_value
+
+
+class FileTypeEvaluation:
+    """Tenants x fields comparison matrix of one fileTypeId, with per-tenant report views."""
+
+    def __init__(self, tenants: List[Dict[str, Any]], fields: List[str], scope: np.ndarray,
+                 statuses: np.ndarray, match_types: np.ndarray, gt_data_list: List[Dict[str, Any]],
+                 pr_data_list: List[Dict[str, Any]], format_value: Callable[[Any], str] = format_value):
+        self.tenants = tenants
+        self.fields = fields
+        self.scope = scope
+        self.statuses = statuses
+        self.match_types = match_types
+        self.gt_data_list = gt_data_list
+        self.pr_data_list = pr_data_list
+        self.format_value = format_value
+
+    def tenant_result(self, t: int) -> ComparisonResult:
+        """The tenant's in-scope row of the matrix as a ComparisonResult."""
+        field_idx = np.flatnonzero(self.scope[t])
+        gt_data, pr_data = self.gt_data_list[t], self.pr_data_list[t]
+        return ComparisonResult.from_statuses(
+            [self.fields[i] for i in field_idx],
+            [self.format_value(gt_data.get(self.fields[i])) for i in field_idx],
+            [self.format_value(pr_data.get(self.fields[i])) for i in field_idx],
+            self.statuses[t, field_idx],
+            self.match_types[t, field_idx]
+        )
+
+    def tenant_report(self, t: int) -> pd.DataFrame:
+        """The per-tenant coverage report (FieldName, Ground_Truth_Value, Predicted_Value_v1, Status_v1, Match_Type_v1)."""
+        return self.tenant_result(t).to_frame()
+
+    def iter_tenant_reports(self, id_columns: tuple = ('tenantId', 'accountStructureFile')) -> Iterator[pd.DataFrame]:
+        """Yields each tenant's report, prefixed with the tenant's id columns, one tenant at a time."""
+        for t, tenant in enumerate(self.tenants):
+            df = self.tenant_report(t)
+            for position, column in enumerate(id_columns):
+                df.insert(position, column, tenant.get(column))
+            yield df
+
+    def consolidated_report(self, id_columns: tuple = ('tenantId', 'accountStructureFile')) -> pd.DataFrame:
+        """All tenants' reports stacked in memory (see report_writer for the streaming form)."""
+        frames = list(self.iter_tenant_reports(id_columns))
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def evaluate_file_type(tenants: List[Dict[str, Any]], gt_data_list: List[Dict[str, Any]],
+                       pr_data_list: List[Dict[str, Any]], exhaustive_fields: Set[str], ignored_fields: Set[str],
+                       decide: DecideFn, absent_match_type: Optional[Callable[[str, Any], Optional[str]]] = None,
+                       value_formatter: Callable[[Any], str] = format_value) -> FileTypeEvaluation:
+    """
+    Builds the tenants x fields matrix for one fileTypeId. 'tenants' holds each tenant's
+    metadata (tenantId, accountStructureFile, ...); gt_data_list/pr_data_list are the
+    flattened, lower-cased field maps in the same order.
+    """
+    exhaustive = {f.lower() for f in exhaustive_fields}
+    all_fields: Set[str] = set(exhaustive)
+    for gt_data, pr_data in zip(gt_data_list, pr_data_list):
+        all_fields.update(gt_data.keys())
+        all_fields.update(pr_data.keys())
+    fields = sorted(f for f in all_fields if f.lower() not in ignored_fields)
+
+    in_exhaustive = np.array([f in exhaustive for f in fields], dtype=bool)
+    scope = np.array([
+        [f in gt_data or f in pr_data for f in fields]
+        for gt_data, pr_data in zip(gt_data_list, pr_data_list)
+    ], dtype=bool).reshape(len(tenants), len(fields)) | in_exhaustive
+
+    statuses, match_types = classify_matrix(fields, gt_data_list, pr_data_list, decide, absent_match_type)
+    print(f"✓ Compared {len(tenants)} tenants x {len(fields)} fields in one pass")
+    return FileTypeEvaluation(tenants, fields, scope, statuses.T, match_types.T,
+                              gt_data_list, pr_data_list, value_formatter)
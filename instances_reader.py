@@ -0,0 +1,107 @@
+"""
+Streaming reader for priority_integration_data/<fileTypeId>/instances.json.
+
+instances.json is one large JSON array of integration instances. Loading it with
+json.load keeps every instance in memory at once; the helpers below decode the
+array one instance at a time instead, so peak memory is bounded by the largest
+single instance rather than by the size of the whole file.
+
+Uses the 'ijson' package when it is installed and falls back to an incremental
+stdlib decoder otherwise.
+"""
+
+import json
+from typing import Any, Dict, Iterator, Optional
+
+# --- Library Setup ---
+try:
+    import ijson
+
+    IJSON_AVAILABLE = True
+except ImportError:
+    IJSON_AVAILABLE = False
+
+READ_CHUNK_SIZE = 1 << 16  # 64 KiB
+_NUMBER_CHARS = frozenset("0123456789+-.eE")
+
+
+def _iter_array_stdlib(f, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[Any]:
+    """Yields the elements of a top-level JSON array read incrementally from a text file."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+
+    def fill(size: int) -> bool:
+        nonlocal buffer, pos, eof
+        chunk = f.read(size)
+        if not chunk:
+            eof = True
+            return False
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        return True
+
+    def skip_whitespace() -> None:
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buffer) or not fill(chunk_size):
+                return
+
+    skip_whitespace()
+    if pos >= len(buffer) or buffer[pos] != "[":
+        raise ValueError("instances file does not contain a top-level JSON array")
+    pos += 1
+
+    expect_element = True
+    while True:
+        skip_whitespace()
+        if pos >= len(buffer):
+            raise ValueError("unexpected end of file inside the instances array")
+        if buffer[pos] == "]":
+            return
+        if not expect_element:
+            if buffer[pos] != ",":
+                raise ValueError(f"expected ',' between array elements, found {buffer[pos]!r}")
+            pos += 1
+            expect_element = True
+            continue
+
+        # Decode one element; if it is cut off by the end of the buffer, read more and retry.
+        # A number cut off there ("123" + "45", "1." + "5") decodes without error but truncated,
+        # so a number followed only by number characters is retried too.
+        read_size = chunk_size
+        while True:
+            try:
+                element, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof or not fill(read_size):
+                    raise
+            else:
+                cut_off = isinstance(element, (int, float)) and all(c in _NUMBER_CHARS for c in buffer[end:])
+                if not cut_off or eof or not fill(read_size):
+                    break
+            read_size *= 2
+        pos = end
+        expect_element = False
+        yield element
+
+
+def iter_instances(instances_json_path: str) -> Iterator[Dict[str, Any]]:
+    """Yields the integration instances in instances.json one at a time."""
+    if IJSON_AVAILABLE:
+        with open(instances_json_path, "rb") as f:
+            yield from ijson.items(f, "item", use_float=True)
+    else:
+        with open(instances_json_path, "r", encoding="utf-8") as f:
+            yield from _iter_array_stdlib(f)
+
+
+def find_instance(instances_json_path: str, tenant_id: str) -> Optional[Dict[str, Any]]:
+    """Returns the first instance for the given tenantId, stopping as soon as it is found."""
+    for instance in iter_instances(instances_json_path):
+        if instance.get("tenantId") == tenant_id:
+            return instance
+    return None
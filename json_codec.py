@@ -0,0 +1,151 @@
+"""
+Single JSON codec used by the pipeline for every load/dump.
+
+Uses 'orjson' when it is installed and falls back to the stdlib 'json' module
+otherwise. dumps() asks both backends for compact separators, UTF-8 output (no
+ASCII escaping) and a 2-space indent for pretty output (the only indent orjson
+supports), but the text is not guaranteed to be identical: floats may be
+formatted differently, and NaN/Infinity become null with orjson while the stdlib
+writes NaN/Infinity. Parse the output rather than comparing it as text.
+
+dumps_report() is the form shown in the report value columns. It always uses the
+stdlib defaults (", " and ": " separators, ASCII escapes), so the
+Ground_Truth_Value/Predicted_Value text is the same as in the original reports.
+
+The backend can be forced with the TIP_JSON_BACKEND environment variable
+("orjson" or "stdlib") or with set_backend().
+
+Run this file directly to benchmark both backends on the bundled corpora:
+    python json_codec.py
+"""
+
+import glob
+import json
+import os
+import time
+from typing import Any, Dict, List
+
+# --- Library Setup ---
+try:
+    import orjson
+
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers can keep catching the stdlib type.
+JSONDecodeError = json.JSONDecodeError
+
+BACKEND = "orjson" if ORJSON_AVAILABLE else "stdlib"
+
+
+def set_backend(name: str) -> str:
+    """Selects the codec backend ("orjson" or "stdlib") and returns the backend in use."""
+    global BACKEND
+    if name not in ("orjson", "stdlib"):
+        raise ValueError(f"Unknown JSON backend '{name}'. Use 'orjson' or 'stdlib'.")
+    if name == "orjson" and not ORJSON_AVAILABLE:
+        print("⚠️ Warning: 'orjson' package not found. Falling back to the stdlib JSON backend.")
+        name = "stdlib"
+    BACKEND = name
+    return BACKEND
+
+
+if os.environ.get("TIP_JSON_BACKEND"):
+    set_backend(os.environ["TIP_JSON_BACKEND"].strip().lower())
+
+
+def loads(data: Any) -> Any:
+    """Parses a JSON document from str or bytes."""
+    if BACKEND == "orjson":
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj: Any, indent: bool = False, sort_keys: bool = False) -> str:
+    """Serializes obj to a JSON string; indent=True gives 2-space pretty output."""
+    if BACKEND == "orjson":
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0) \
+            | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+        try:
+            return orjson.dumps(obj, option=option).decode("utf-8")
+        except TypeError:
+            # e.g. integers wider than 64 bits; let the stdlib encoder handle them
+            pass
+    if indent:
+        return json.dumps(obj, indent=2, ensure_ascii=False, sort_keys=sort_keys)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, sort_keys=sort_keys)
+
+
+def dumps_report(obj: Any) -> str:
+    """Serializes obj the way the report columns always have (stdlib json.dumps defaults)."""
+    return json.dumps(obj)
+
+
+def load(file_path: str) -> Any:
+    """Reads and parses a JSON file."""
+    with open(file_path, "rb") as f:
+        return loads(f.read())
+
+
+def dump(obj: Any, file_path: str, indent: bool = True) -> None:
+    """Writes obj to a JSON file (pretty-printed by default)."""
+    with open(file_path, "w", encoding="utf-8") as f:
+        f.write(dumps(obj, indent=indent))
+
+
+# ==============================================================================
+# --- BENCHMARK ---
+# ==============================================================================
+
+def _time_it(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def benchmark(paths: List[str], repeat: int = 3) -> List[Dict[str, Any]]:
+    """Times load and pretty dump of each file with every available backend."""
+    backends = ["stdlib"] + (["orjson"] if ORJSON_AVAILABLE else [])
+    previous = BACKEND
+    results = []
+    try:
+        for path in paths:
+            with open(path, "rb") as f:
+                raw = f.read()
+            row = {"file": path, "size_mb": len(raw) / 1e6}
+            for backend in backends:
+                set_backend(backend)
+                obj = loads(raw)
+                row[f"{backend}_load_s"] = _time_it(lambda: loads(raw), repeat)
+                row[f"{backend}_dump_s"] = _time_it(lambda: dumps(obj, indent=True), repeat)
+            results.append(row)
+    finally:
+        set_backend(previous)
+    return results
+
+
+if __name__ == "__main__":
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    corpus = sorted(glob.glob(os.path.join(script_dir, "priority_integration_data", "*", "instances.json")))
+    corpus += sorted(glob.glob(os.path.join(script_dir, "outputs", "**", "*.json"), recursive=True))
+    if not corpus:
+        print("✗ No JSON files found to benchmark.")
+        raise SystemExit(1)
+
+    print(f"Benchmarking {len(corpus)} JSON files (backends: stdlib{', orjson' if ORJSON_AVAILABLE else ''})...")
+    rows = benchmark(corpus)
+    totals = {key: sum(r[key] for r in rows) for key in rows[0] if key.endswith("_s")}
+    total_mb = sum(r["size_mb"] for r in rows)
+    print(f"\n📊 Total corpus: {total_mb:.1f} MB")
+    for key, seconds in totals.items():
+        print(f"   {key:<16} {seconds * 1000:9.1f} ms")
+    if ORJSON_AVAILABLE:
+        for op in ("load", "dump"):
+            speedup = totals[f"stdlib_{op}_s"] / max(totals[f"orjson_{op}_s"], 1e-9)
+            print(f"   orjson {op} speedup: {speedup:.1f}x")
+    else:
+        print("   Install 'orjson' to compare against the native backend.")
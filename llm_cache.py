@@ -0,0 +1,152 @@
+"""
+Persistent cache of LLM match verdicts.
+
+PredictionComparator asks the LLM to judge every field that is neither an exact
+match nor settled by a field matcher or JSON deep equality. The same
+(field, GT value, predicted value) triple shows up again on every re-run and for
+every iteration of a tenant, so verdicts are stored in a small SQLite file and
+reused.
+
+The cache key is the SHA-256 of:
+    field name (lower-cased), GT and predicted values in canonical form
+    (structural hash for JSON values, stripped text otherwise),
+    the prompt version and the model name
+so changing the prompt or the model never returns stale verdicts.
+
+Entries expire after 'ttl_seconds' and the file holds at most 'max_entries'
+verdicts; when it grows past that, the least recently used entries are evicted.
+Hits do not write to the file one by one: their access times are buffered and
+flushed in one transaction every 'touch_flush_every' hits, before an eviction,
+and in stats() and close().
+Transient failures ("llm_error") are never cached. All methods are thread-safe.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from canonical_json import canonicalize
+
+DEFAULT_TTL_SECONDS = 30 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 50000
+DEFAULT_TOUCH_FLUSH_EVERY = 256  # cache hits whose access times are written together
+UNCACHEABLE_VERDICTS = {"llm_error", ""}
+
+
+def verdict_key(field_name: str, gt_value: Any, pr_value: Any, prompt_version: str, model_name: str) -> str:
+    """Hash of the normalized (field, GT, prediction) triple plus prompt version and model."""
+    gt, pr = canonicalize(gt_value), canonicalize(pr_value)
+    parts = [field_name.lower(), gt.digest, pr.digest, prompt_version, model_name]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class LLMVerdictCache:
+    """SQLite-backed verdict cache with TTL expiry and LRU size bound."""
+
+    def __init__(self, db_path: str, prompt_version: str, model_name: str,
+                 ttl_seconds: int = DEFAULT_TTL_SECONDS, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 touch_flush_every: int = DEFAULT_TOUCH_FLUSH_EVERY):
+        self.db_path = db_path
+        self.prompt_version = prompt_version
+        self.model_name = model_name
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.touch_flush_every = touch_flush_every
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._pending_touches: Dict[str, float] = {}  # key -> last_used not yet written
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS verdicts ("
+            " key TEXT PRIMARY KEY, verdict TEXT NOT NULL, field_name TEXT,"
+            " created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_verdicts_last_used ON verdicts(last_used)")
+        self._conn.commit()
+        self.purge_expired()
+
+    def key(self, field_name: str, gt_value: Any, pr_value: Any) -> str:
+        return verdict_key(field_name, gt_value, pr_value, self.prompt_version, self.model_name)
+
+    def get(self, field_name: str, gt_value: Any, pr_value: Any) -> Optional[str]:
+        """Returns the cached verdict, or None on a miss (expired entries count as misses)."""
+        key = self.key(field_name, gt_value, pr_value)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT verdict, created_at FROM verdicts WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                if row is not None:
+                    self._conn.execute("DELETE FROM verdicts WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._pending_touches[key] = now
+            if len(self._pending_touches) >= self.touch_flush_every:
+                self._flush_touches()
+            self.hits += 1
+            return row[0]
+
+    def put(self, field_name: str, gt_value: Any, pr_value: Any, verdict: str) -> None:
+        """Stores a verdict; transient failures are skipped."""
+        if verdict in UNCACHEABLE_VERDICTS:
+            return
+        key = self.key(field_name, gt_value, pr_value)
+        now = time.time()
+        with self._lock:
+            self._pending_touches.pop(key, None)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO verdicts (key, verdict, field_name, created_at, last_used)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, verdict, field_name, now, now)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _flush_touches(self) -> None:
+        """Writes the buffered access times in one transaction (caller holds the lock)."""
+        if self._pending_touches:
+            self._conn.executemany("UPDATE verdicts SET last_used = ? WHERE key = ?",
+                                   [(used, key) for key, used in self._pending_touches.items()])
+            self._pending_touches.clear()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        count = self._conn.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+        if count > self.max_entries:
+            # Evict by up-to-date access times
+            self._flush_touches()
+            self._conn.execute(
+                "DELETE FROM verdicts WHERE key IN (SELECT key FROM verdicts ORDER BY last_used LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def purge_expired(self) -> int:
+        """Deletes expired entries and returns how many were removed."""
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM verdicts WHERE created_at < ?",
+                                        (time.time() - self.ttl_seconds,))
+            self._conn.commit()
+            return cursor.rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._flush_touches()
+            size = self._conn.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": size,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_touches()
+            self._conn.close()
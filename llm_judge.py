@@ -0,0 +1,180 @@
+"""
+Batched LLM judging of ambiguous field comparisons.
+
+Instead of one generate_content request per field, many (field, GT, prediction)
+items are packed into a single prompt that asks for a JSON array of verdicts:
+
+    [{"id": 0, "category": "incorrect"}, {"id": 1, "category": "json_partial_correct"}, ...]
+
+Items are split into batches by an approximate token budget (about 4 characters
+per token). Items whose verdict is missing or cannot be parsed are retried in a
+new batch; whatever is still unresolved after the retries is returned as None so
+the caller can fall back to the single-field prompt.
+
+Batches (and single-field fallback calls) can be sent concurrently through a
+bounded thread pool; a shared RateLimiter keeps the request rate under the
+configured requests-per-minute across all workers. Results always come back in
+input order.
+"""
+
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+import json_codec
+
+LLM_CATEGORIES = ("no_prediction", "json_partial_correct", "incorrect")
+
+DEFAULT_BATCH_TOKEN_BUDGET = 6000
+DEFAULT_BATCH_MAX_ITEMS = 50
+DEFAULT_BATCH_RETRIES = 1
+CHARS_PER_TOKEN = 4
+DEFAULT_MAX_WORKERS = 4
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+BATCH_PROMPT_HEADER = """
+Analyze each predicted value compared to the ground truth for its field and categorize every prediction.
+Each item below has an "id", a "field_name", a "gt_value" (ground truth) and a "predicted_value".
+**Categories:**
+1. **no_prediction**: the "predicted_value" is empty, null, or effectively blank.
+2. **json_partial_correct**: ONLY if both the GT and predicted values have matching 'values' or 'tables'.
+3. **incorrect**: the prediction is clearly wrong.
+**Response format:**
+Return ONLY a JSON array with one object per item, in any order, and nothing else:
+[{"id": <item id>, "category": "<one of: no_prediction, json_partial_correct, incorrect>"}]
+**Items:**
+"""
+
+_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$", re.IGNORECASE)
+
+
+class RateLimiter:
+    """Spaces request starts so that at most 'requests_per_minute' begin per minute (None/0 = unlimited)."""
+
+    def __init__(self, requests_per_minute: Optional[float] = None):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def map_concurrently(fn: Callable[[T], R], args: List[T], max_workers: int = DEFAULT_MAX_WORKERS,
+                     rate_limiter: Optional[RateLimiter] = None) -> List[R]:
+    """Applies fn to every arg on a bounded thread pool, rate limited, and returns results in input order."""
+    def call(arg: T) -> R:
+        if rate_limiter:
+            rate_limiter.wait()
+        return fn(arg)
+
+    if max_workers <= 1 or len(args) <= 1:
+        return [call(arg) for arg in args]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(args))) as pool:
+        return list(pool.map(call, args))
+
+
+def estimate_tokens(item: Dict[str, Any]) -> int:
+    """Rough token count of one item as it appears in the batch prompt."""
+    size = len(item["field_name"]) + len(item["gt_value"]) + len(item["predicted_value"]) + 64
+    return size // CHARS_PER_TOKEN + 1
+
+
+def split_by_token_budget(items: List[Dict[str, Any]], token_budget: int = DEFAULT_BATCH_TOKEN_BUDGET,
+                          max_items: int = DEFAULT_BATCH_MAX_ITEMS) -> List[List[Dict[str, Any]]]:
+    """Greedily packs items into batches that stay under the token budget (an oversized item gets its own batch)."""
+    batches: List[List[Dict[str, Any]]] = []
+    current: List[Dict[str, Any]] = []
+    used = 0
+    for item in items:
+        cost = estimate_tokens(item)
+        if current and (used + cost > token_budget or len(current) >= max_items):
+            batches.append(current)
+            current, used = [], 0
+        current.append(item)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def build_batch_prompt(items: List[Dict[str, Any]]) -> str:
+    payload = [
+        {"id": item["id"], "field_name": item["field_name"],
+         "gt_value": item["gt_value"], "predicted_value": item["predicted_value"]}
+        for item in items
+    ]
+    return BATCH_PROMPT_HEADER + json_codec.dumps(payload, indent=True)
+
+
+def parse_batch_response(text: str, expected_ids: List[int]) -> Dict[int, str]:
+    """
+    Extracts {id: category} from a batch response. Unknown ids, invalid categories
+    and malformed entries are dropped, so the caller can retry just those items.
+    """
+    text = _FENCE_RE.sub("", (text or "").strip())
+    start, end = text.find("["), text.rfind("]")
+    if start == -1 or end <= start:
+        return {}
+    try:
+        entries = json_codec.loads(text[start:end + 1])
+    except (json_codec.JSONDecodeError, TypeError):
+        return {}
+    if not isinstance(entries, list):
+        return {}
+
+    wanted = set(expected_ids)
+    verdicts: Dict[int, str] = {}
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        try:
+            item_id = int(entry.get("id"))
+        except (TypeError, ValueError):
+            continue
+        category = str(entry.get("category", "")).strip().lower()
+        if item_id in wanted and category in LLM_CATEGORIES:
+            verdicts[item_id] = category
+    return verdicts
+
+
+def judge_in_batches(items: List[Dict[str, Any]], generate: Callable[[str], str],
+                     token_budget: int = DEFAULT_BATCH_TOKEN_BUDGET, max_items: int = DEFAULT_BATCH_MAX_ITEMS,
+                     retries: int = DEFAULT_BATCH_RETRIES, max_workers: int = 1,
+                     rate_limiter: Optional[RateLimiter] = None) -> Dict[int, Optional[str]]:
+    """
+    Judges items ({id, field_name, gt_value, predicted_value}) with as few prompts as
+    the token budget allows, sending up to 'max_workers' batches at once.
+    'generate' sends a prompt and returns the response text.
+    Returns {id: category}, with None for items that never got a valid verdict.
+    """
+    def judge_batch(batch: List[Dict[str, Any]]) -> Dict[int, str]:
+        try:
+            return parse_batch_response(generate(build_batch_prompt(batch)), [item["id"] for item in batch])
+        except Exception as e:
+            print(f"  - Batched LLM call failed for {len(batch)} fields: {e}")
+            return {}
+
+    verdicts: Dict[int, Optional[str]] = {item["id"]: None for item in items}
+    pending = list(items)
+    for _ in range(retries + 1):
+        if not pending:
+            break
+        batches = split_by_token_budget(pending, token_budget, max_items)
+        unresolved = []
+        for batch, parsed in zip(batches, map_concurrently(judge_batch, batches, max_workers, rate_limiter)):
+            verdicts.update(parsed)
+            unresolved.extend(item for item in batch if item["id"] not in parsed)
+        pending = unresolved
+    return verdicts
@@ -1,5 +1,380 @@
-import pandas as pd
+"""
+Coverage / accuracy / extra-fields metrics for comparison reports.
+
+One engine serves every input the pipeline produces:
+
+    - a report DataFrame or CSV path (coverage_report_*.csv, consolidated_report.csv,
+      multi-iteration reports with Status_v1 ... Status_vN columns);
+    - a ComparisonResult (one tenant's in-memory report);
+    - a FileTypeEvaluation (a batch of tenants of one fileTypeId).
+
+Rows are counted in a single pass: the status labels become integer codes and
+one np.bincount over (group, iteration, status) gives every count at once, so it
+stays fast on consolidated reports with millions of rows. Per-fileType and
+global metrics are sums over the per-tenant counts ("pooled" rates), reported
+next to the mean of the per-tenant rates. coverage_accuracy() is the only
+definition of the two rates; the pipeline, the multi-iteration summary and the
+run store all go through this module.
+
+    metrics = compute_metrics(consolidated_df)
+    metrics['tenant'], metrics['fileType'], metrics['global']
+
+field_leaderboard() applies the same pass per (fileTypeId, FieldName) across all
+tenants, iterations and runs in the input, and ranks fields worst-first, so the
+fields driving accuracy drops (and the ones that most often need a rule, the
+partial-match scorer or the LLM to decide) stand out.
+
+A fileType usually has only 2-4 tenants, so bootstrap_ci() adds confidence
+intervals to the pooled coverage and accuracy, and paired_bootstrap_test()
+compares two runs of the same tenants. Both are vectorized over the resamples:
+
+    level="tenant"  resample tenants with replacement (a B x tenants index matrix);
+    level="field"   resample field cells; i.i.d. resampling of cells is a multinomial
+                    draw over the status counts (paired: over the 5 x 5 table of
+                    baseline/candidate statuses), so its cost does not depend on
+                    the number of rows.
+
+10,000 resamples per fileType take milliseconds.
+"""
+
+import re
 import sys
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from comparison_result import ComparisonResult, STATUS_ORDER, STATUS_COUNT_KEYS
+from field_catalog import RARE_FIELD_TENANT_FRACTION
+from filetype_evaluator import FileTypeEvaluation
+
+STATUS_COLUMN_RE = re.compile(r"^Status(?:_v(\d+))?$")
+MATCH_TYPE_COLUMN_RE = re.compile(r"^Match_Type(?:_v(\d+))?$")
+EXACT_MATCH_TYPE = "exact_match"
+DEFAULT_GROUP_COLUMNS = ("fileTypeId", "tenantId")
+DEFAULT_RESAMPLES = 10000
+DEFAULT_CONFIDENCE = 0.95
+BOOTSTRAP_LEVELS = ("tenant", "field")
+
+MetricsInput = Union[str, pd.DataFrame, ComparisonResult, FileTypeEvaluation]
+
+
+def status_columns(columns: Sequence[str]) -> List[str]:
+    """Status columns of a report in iteration order (Status_v1 ... Status_vN, or a plain 'Status')."""
+    found = [(int(m.group(1) or 0), c) for c in columns if (m := STATUS_COLUMN_RE.match(str(c)))]
+    return [c for _, c in sorted(found)]
+
+
+def status_codes(values: Any) -> np.ndarray:
+    """Vectorized status label -> code (index into STATUS_ORDER); unknown labels are -1."""
+    return pd.Categorical(values, categories=STATUS_ORDER).codes
+
+
+def coverage_accuracy(match: Any, mismatch: Any, pr_absent: Any) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Unrounded coverage (present / GT present) and accuracy (match / present) of status
+    counts; works on ints or numpy arrays. Both are 0.0 when their denominator is 0.
+    """
+    match, mismatch, pr_absent = np.asarray(match), np.asarray(mismatch), np.asarray(pr_absent)
+    present = match + mismatch
+    gt_total = present + pr_absent
+    coverage = np.where(gt_total > 0, present / np.maximum(gt_total, 1), 0.0)
+    accuracy = np.where(present > 0, match / np.maximum(present, 1), 0.0)
+    return coverage, accuracy
+
+
+def read_report(csv_file_path: str, group_columns: Sequence[str] = DEFAULT_GROUP_COLUMNS,
+                with_match_types: bool = False) -> pd.DataFrame:
+    """Loads only the group and status (and optionally match-type) columns of a report CSV."""
+    def wanted(column: str) -> bool:
+        return (column in group_columns or bool(STATUS_COLUMN_RE.match(column))
+                or (with_match_types and bool(MATCH_TYPE_COLUMN_RE.match(column))))
+    return pd.read_csv(csv_file_path, dtype=str, keep_default_na=False, usecols=wanted)
+
+
+def count_statuses(df: pd.DataFrame, group_columns: Sequence[str] = DEFAULT_GROUP_COLUMNS) -> pd.DataFrame:
+    """
+    Status counts per group and iteration in one pass. Returns one row per
+    (group..., iteration) with total_fields and the STATUS_COUNT_KEYS counts.
+    Group columns missing from the frame are ignored.
+    """
+    group_columns = [c for c in group_columns if c in df.columns]
+    columns = status_columns(df.columns)
+    if not columns:
+        raise ValueError("The report has no Status or Status_vN column.")
+    n_status, n_iter = len(STATUS_ORDER), len(columns)
+
+    if group_columns:
+        grouped = df.groupby(group_columns, sort=True)
+        groups = grouped.ngroup().fillna(-1).to_numpy(dtype=np.int64)
+        keys = grouped.size().index.to_frame(index=False)
+    else:
+        groups = np.zeros(len(df), dtype=np.int64)
+        keys = pd.DataFrame(index=range(1))
+    n_groups = len(keys)
+
+    counts = np.zeros((n_groups * n_iter, n_status), dtype=np.int64)
+    totals = np.zeros(n_groups * n_iter, dtype=np.int64)
+    in_group = groups >= 0
+    for j, column in enumerate(columns):
+        codes = status_codes(df[column].to_numpy())
+        cell = groups * n_iter + j
+        totals += np.bincount(cell[in_group], minlength=n_groups * n_iter)
+        known = in_group & (codes >= 0)
+        counts += np.bincount(cell[known] * n_status + codes[known],
+                              minlength=n_groups * n_iter * n_status).reshape(-1, n_status)
+
+    result = keys.loc[np.repeat(np.arange(n_groups), n_iter)].reset_index(drop=True)
+    result['iteration'] = np.tile(np.arange(1, n_iter + 1), n_groups)
+    result['total_fields'] = totals
+    for i, key in enumerate(STATUS_COUNT_KEYS):
+        result[key] = counts[:, i]
+    return result
+
+
+def counts_of(data: MetricsInput, group_columns: Sequence[str] = DEFAULT_GROUP_COLUMNS) -> pd.DataFrame:
+    """Per-tenant (and per-iteration) status counts of any supported input."""
+    if isinstance(data, str):
+        return count_statuses(read_report(data, group_columns), group_columns)
+    if isinstance(data, pd.DataFrame):
+        if not status_columns(data.columns) and set(STATUS_COUNT_KEYS) <= set(data.columns):
+            # Already counted (e.g. metrics_summary.csv or the run store's tenant_metrics)
+            counts = data.copy()
+            if 'iteration' not in counts.columns:
+                counts['iteration'] = 1
+            return counts
+        return count_statuses(data, group_columns)
+    if isinstance(data, ComparisonResult):
+        counts = count_statuses(data.to_frame(), ())
+        counts['iteration'] = data.version
+        return counts
+    if isinstance(data, FileTypeEvaluation):
+        return count_statuses(data.consolidated_report(id_columns=tuple(group_columns)), group_columns)
+    raise TypeError(f"Unsupported metrics input: {type(data).__name__}")
+
+
+def add_rates(counts: pd.DataFrame) -> pd.DataFrame:
+    """Adds coverage, accuracy (rounded to 4 places) and extra_fields_count columns to a counts frame."""
+    counts = counts.copy()
+    coverage, accuracy = coverage_accuracy(*(counts[key].to_numpy() for key in STATUS_COUNT_KEYS[:3]))
+    counts['coverage'] = np.round(coverage, 4)
+    counts['accuracy'] = np.round(accuracy, 4)
+    counts['extra_fields_count'] = counts['gt_absent_pr_present']
+    return counts
+
+
+def _pool(tenant_metrics: pd.DataFrame, by: List[str]) -> pd.DataFrame:
+    """Sums the tenant counts over 'by' and adds pooled rates plus the mean of the tenant rates."""
+    sums = ['total_fields', *STATUS_COUNT_KEYS]
+    grouped = tenant_metrics.groupby(by, sort=True)
+    pooled = add_rates(grouped[sums].sum().reset_index())
+    means = grouped[['coverage', 'accuracy']].mean().round(4).reset_index(drop=True)
+    pooled['tenants'] = grouped.size().to_numpy()
+    pooled['mean_coverage'] = means['coverage'].to_numpy()
+    pooled['mean_accuracy'] = means['accuracy'].to_numpy()
+    return pooled
+
+
+def compute_metrics(data: MetricsInput,
+                    group_columns: Sequence[str] = DEFAULT_GROUP_COLUMNS) -> Dict[str, pd.DataFrame]:
+    """
+    Tenant, fileType and global metrics of a report, one row per iteration at each level.
+    The 'fileType' level is only present when the input carries a fileTypeId column.
+    """
+    tenant = add_rates(counts_of(data, group_columns))
+    metrics = {'tenant': tenant}
+    if 'fileTypeId' in tenant.columns:
+        metrics['fileType'] = _pool(tenant, ['fileTypeId', 'iteration'])
+    metrics['global'] = _pool(tenant, ['iteration'])
+    return metrics
+
+
+def field_leaderboard(data: Union[str, pd.DataFrame, FileTypeEvaluation],
+                      group_columns: Sequence[str] = ("fileTypeId",),
+                      catalog: Optional[Dict[str, Dict[str, Any]]] = None) -> pd.DataFrame:
+    """
+    Per-field coverage, accuracy and extra-prediction rate, pooled over every tenant,
+    iteration and run in the input and ranked worst-first within each group by
+    error_rate (mismatches, missed fields and extra predictions per observation),
+    then by mismatches and accuracy.
+
+    'judged' counts cells present on both sides that were not an exact match, i.e.
+    the comparisons that needed a field rule, the partial-match scorer or the LLM.
+
+    With a field catalog (field_catalog.load_field_catalog) each field also gets its
+    corpus occurrences, tenant_fraction and value_type, and 'rare' marks fields that
+    fewer than RARE_FIELD_TENANT_FRACTION of the corpus tenants carry.
+    """
+    keys = [*group_columns, 'FieldName']
+    if isinstance(data, str):
+        df = read_report(data, keys, with_match_types=True)
+    elif isinstance(data, FileTypeEvaluation):
+        df = data.consolidated_report(id_columns=tuple(dict.fromkeys((*group_columns, 'tenantId'))))
+    else:
+        df = data
+    keys = [c for c in keys if c in df.columns]
+
+    counts = count_statuses(df, keys)
+    judged = np.zeros(len(counts) // max(len(status_columns(df.columns)), 1), dtype=np.int64)
+    groups = df.groupby(keys, sort=True).ngroup().fillna(-1).to_numpy(dtype=np.int64)
+    for column in status_columns(df.columns):
+        match_column = column.replace("Status", "Match_Type", 1)
+        if match_column not in df.columns:
+            continue
+        codes = status_codes(df[column].to_numpy())
+        decided = (groups >= 0) & (codes >= 0) & (codes <= 1) & (df[match_column].to_numpy() != EXACT_MATCH_TYPE)
+        judged += np.bincount(groups[decided], minlength=len(judged))
+
+    sums = ['total_fields', *STATUS_COUNT_KEYS]
+    board = add_rates(counts.groupby(keys, sort=True)[sums].sum().reset_index())
+    board = board.rename(columns={'total_fields': 'observations'})
+    board['extra_rate'] = np.round(board['gt_absent_pr_present'] / board['observations'].clip(lower=1), 4)
+    board['judged'] = judged
+    board['judged_rate'] = np.round(judged / board['observations'].clip(lower=1), 4)
+    errors = board['gt_present_pr_present_mismatch'] + board['gt_present_pr_absent'] + board['gt_absent_pr_present']
+    board['error_rate'] = np.round(errors / board['observations'].clip(lower=1), 4)
+    board = board.sort_values(
+        [*keys[:-1], 'error_rate', 'gt_present_pr_present_mismatch', 'accuracy', 'FieldName'],
+        ascending=[*[True] * (len(keys) - 1), False, False, True, True], kind='stable').reset_index(drop=True)
+    board['rank'] = board.groupby(keys[:-1]).cumcount() + 1 if len(keys) > 1 else np.arange(1, len(board) + 1)
+    if catalog is not None:
+        by_name = {name.lower(): meta for name, meta in catalog.items()}
+        metadata = [by_name.get(name, {}) for name in board['FieldName']]
+        board['occurrences'] = [meta.get('occurrences', 0) for meta in metadata]
+        board['tenant_fraction'] = [meta.get('tenant_fraction', 0.0) for meta in metadata]
+        board['value_type'] = [meta.get('value_type', '') for meta in metadata]
+        board['rare'] = board['tenant_fraction'] < RARE_FIELD_TENANT_FRACTION
+    return board
+
+
+def _resample_counts(counts: np.ndarray, level: str, resamples: int,
+                     rng: np.random.Generator) -> np.ndarray:
+    """
+    (resamples x 3) match / mismatch / GT-present-PR-absent counts of bootstrap samples
+    drawn from a (tenants x 5) status count matrix.
+    """
+    if level == "tenant":
+        idx = rng.integers(0, len(counts), size=(resamples, len(counts)))
+        return counts[idx, :3].sum(axis=1)
+    total = counts.sum()
+    draws = rng.multinomial(total, counts.sum(axis=0) / max(total, 1), size=resamples)
+    return draws[:, :3]
+
+
+def _interval(values: np.ndarray, confidence: float) -> Tuple[float, float]:
+    tail = (1 - confidence) / 2 * 100
+    low, high = np.percentile(values, [tail, 100 - tail])
+    return round(float(low), 4), round(float(high), 4)
+
+
+def bootstrap_ci(data: MetricsInput, level: str = "tenant", resamples: int = DEFAULT_RESAMPLES,
+                 confidence: float = DEFAULT_CONFIDENCE, seed: Optional[int] = None,
+                 group_columns: Sequence[str] = DEFAULT_GROUP_COLUMNS) -> pd.DataFrame:
+    """
+    Percentile bootstrap intervals for the pooled coverage and accuracy, one row per
+    fileTypeId (and iteration). 'level' is "tenant" or "field" (see module docstring).
+    """
+    if level not in BOOTSTRAP_LEVELS:
+        raise ValueError(f"Unknown bootstrap level '{level}'. Use one of {', '.join(BOOTSTRAP_LEVELS)}.")
+    rng = np.random.default_rng(seed)
+    counts = counts_of(data, group_columns)
+    by = [c for c in ('fileTypeId', 'iteration') if c in counts.columns]
+
+    rows = []
+    for key, group in counts.groupby(by, sort=True) if by else [((), counts)]:
+        matrix = group[list(STATUS_COUNT_KEYS)].to_numpy(dtype=np.int64)
+        coverage, accuracy = coverage_accuracy(*matrix[:, :3].sum(axis=0))
+        sample_coverage, sample_accuracy = coverage_accuracy(*_resample_counts(matrix, level, resamples, rng).T)
+        row = dict(zip(by, key if isinstance(key, tuple) else (key,)))
+        row.update({
+            'level': level, 'tenants': len(group), 'resamples': resamples,
+            'coverage': round(float(coverage), 4),
+            **dict(zip(('coverage_low', 'coverage_high'), _interval(sample_coverage, confidence))),
+            'accuracy': round(float(accuracy), 4),
+            **dict(zip(('accuracy_low', 'accuracy_high'), _interval(sample_accuracy, confidence))),
+        })
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def _report_rows(data: Union[str, pd.DataFrame, FileTypeEvaluation]) -> pd.DataFrame:
+    """fileTypeId / tenantId / FieldName and the first status column of a report, as status codes."""
+    if isinstance(data, str):
+        df = read_report(data, ('fileTypeId', 'tenantId', 'FieldName'))
+    elif isinstance(data, FileTypeEvaluation):
+        df = data.consolidated_report(id_columns=('fileTypeId', 'tenantId'))
+    else:
+        df = data
+    columns = status_columns(df.columns)
+    if not columns or 'FieldName' not in df.columns:
+        raise ValueError("Field-level paired tests need report rows with FieldName and a Status column.")
+    keys = [c for c in ('fileTypeId', 'tenantId', 'FieldName') if c in df.columns]
+    rows = df[keys].copy()
+    rows['code'] = status_codes(df[columns[0]].to_numpy())
+    return rows
+
+
+def paired_bootstrap_test(baseline: MetricsInput, candidate: MetricsInput, level: str = "tenant",
+                          resamples: int = DEFAULT_RESAMPLES, confidence: float = DEFAULT_CONFIDENCE,
+                          seed: Optional[int] = None) -> pd.DataFrame:
+    """
+    Paired bootstrap comparison of two runs over the tenants (level="tenant") or the
+    (tenant, field) cells (level="field") present in both. One row per fileTypeId and
+    metric with the change (candidate - baseline), its interval and a two-sided p-value.
+    """
+    if level not in BOOTSTRAP_LEVELS:
+        raise ValueError(f"Unknown bootstrap level '{level}'. Use one of {', '.join(BOOTSTRAP_LEVELS)}.")
+    rng = np.random.default_rng(seed)
+    n_status = len(STATUS_ORDER)
+
+    if level == "tenant":
+        base, cand = counts_of(baseline), counts_of(candidate)
+        keys = [c for c in ('fileTypeId', 'tenantId', 'accountStructureFile', 'iteration')
+                if c in base.columns and c in cand.columns]
+        paired = base.merge(cand, on=keys, suffixes=('_base', '_cand'))
+        by = ['fileTypeId'] if 'fileTypeId' in keys else []
+    else:
+        base, cand = _report_rows(baseline), _report_rows(candidate)
+        keys = [c for c in ('fileTypeId', 'tenantId', 'FieldName') if c in base.columns and c in cand.columns]
+        paired = base.merge(cand, on=keys, suffixes=('_base', '_cand'))
+        paired = paired[(paired['code_base'] >= 0) & (paired['code_cand'] >= 0)]
+        by = ['fileTypeId'] if 'fileTypeId' in keys else []
+
+    rows = []
+    for key, group in paired.groupby(by, sort=True) if by else [((), paired)]:
+        if level == "tenant":
+            b = group[[f"{k}_base" for k in STATUS_COUNT_KEYS[:3]]].to_numpy(dtype=np.int64)
+            c = group[[f"{k}_cand" for k in STATUS_COUNT_KEYS[:3]]].to_numpy(dtype=np.int64)
+            idx = rng.integers(0, len(group), size=(resamples, len(group)))
+            b_samples, c_samples = b[idx].sum(axis=1), c[idx].sum(axis=1)
+            b_point, c_point = b.sum(axis=0), c.sum(axis=0)
+            pairs = len(group)
+        else:
+            # 5 x 5 table of (baseline status, candidate status); cells are resampled as one multinomial
+            cells = np.bincount(group['code_base'].to_numpy() * n_status + group['code_cand'].to_numpy(),
+                                minlength=n_status * n_status)
+            draws = rng.multinomial(cells.sum(), cells / max(cells.sum(), 1), size=resamples)
+            draws = draws.reshape(resamples, n_status, n_status)
+            b_samples, c_samples = draws.sum(axis=2)[:, :3], draws.sum(axis=1)[:, :3]
+            table = cells.reshape(n_status, n_status)
+            b_point, c_point = table.sum(axis=1)[:3], table.sum(axis=0)[:3]
+            pairs = int(cells.sum())
+
+        group_key = dict(zip(by, key if isinstance(key, tuple) else (key,)))
+        for metric, b_rate, c_rate, b_point_rate, c_point_rate in zip(
+                ('coverage', 'accuracy'), coverage_accuracy(*b_samples.T), coverage_accuracy(*c_samples.T),
+                coverage_accuracy(*b_point), coverage_accuracy(*c_point)):
+            delta = c_rate - b_rate
+            # (1 + count) / (B + 1) per tail, so a finite number of resamples never reports p = 0
+            tails = (1 + np.array([(delta <= 0).sum(), (delta >= 0).sum()])) / (resamples + 1)
+            p_value = min(1.0, 2 * float(tails.min()))
+            low, high = _interval(delta, confidence)
+            rows.append({**group_key, 'metric': metric, 'level': level, 'pairs': pairs,
+                         'baseline': round(float(b_point_rate), 4), 'candidate': round(float(c_point_rate), 4),
+                         'delta': round(float(c_point_rate - b_point_rate), 4),
+                         'delta_low': low, 'delta_high': high, 'p_value': round(p_value, 4)})
+    return pd.DataFrame(rows)
+
 
 def calculate_metrics_from_csv(file_path):
     """
@@ -16,7 +391,7 @@ def calculate_metrics_from_csv(file_path):
                           or None if an error occurs.
     """
     try:
-        df = pd.read_csv(file_path)
+        df = read_report(file_path, ('tenantId',))
     except FileNotFoundError:
         print(f"Error: The file '{file_path}' was not found.")
         return None
@@ -30,44 +405,20 @@ def calculate_metrics_from_csv(file_path):
         print(f"Error: The CSV must contain the following columns: {required_columns}")
         return None
 
-    results = []
-    # Group the DataFrame by tenantId to perform calculations for each tenant separately
-    for tenant_id, group in df.groupby('tenantId'):
-        # Count occurrences of each status type for the current tenant
-        status_counts = group['Status_v1'].value_counts()
-
-        gt_present_pr_present_match = status_counts.get('GT Present PR Present and match', 0)
-        gt_present_pr_present_mismatch = status_counts.get('GT Present PR Present but mismatch', 0)
-        gt_present_pr_absent = status_counts.get('GT Present PR Absent', 0)
-        gt_absent_pr_present = status_counts.get('GT Absent PR Present', 0)
-
-        # --- Metric Calculations ---
-
-        # Coverage = (GT present and prediction present) / (Total fields whose GT is present)
-        gt_present_total = gt_present_pr_present_match + gt_present_pr_present_mismatch + gt_present_pr_absent
-        prediction_present_and_gt_present = gt_present_pr_present_match + gt_present_pr_present_mismatch
-        coverage = prediction_present_and_gt_present / gt_present_total if gt_present_total > 0 else 0
-
-        # Accuracy = (GT present and Prediction match) / (GT present and Prediction present)
-        gt_present_and_prediction_present_total = gt_present_pr_present_match + gt_present_pr_present_mismatch
-        accuracy = gt_present_pr_present_match / gt_present_and_prediction_present_total if gt_present_and_prediction_present_total > 0 else 0
-
-        # Extra Fields = Count(GT absent PR present)
-        extra_fields = gt_absent_pr_present
-
-        results.append({
-            "tenantId": tenant_id,
-            "Coverage": f"{coverage:.2%}",
-            "Accuracy": f"{accuracy:.2%}",
-            "Extra Fields": extra_fields
-        })
-
-    return pd.DataFrame(results)
+    tenant = add_rates(count_statuses(df[required_columns], ['tenantId']))
+    return pd.DataFrame({
+        "tenantId": tenant['tenantId'],
+        "Coverage": [f"{c:.2%}" for c in tenant['coverage']],
+        "Accuracy": [f"{a:.2%}" for a in tenant['accuracy']],
+        "Extra Fields": tenant['extra_fields_count'],
+    })
 
 if __name__ == "__main__":
     # --- IMPORTANT ---
-    # Change this variable to the path of your CSV file.
+    # Change this variable to the path of your CSV file (or pass it as the first argument).
     csv_file_path = 'C:\\Users\\nitai.agarwal\\PycharmProjects\\PythonProject\\TIP_testing_pipeline\\outputs\\usg.cigna.834-proclaim\\consolidated_report.csv'
+    if len(sys.argv) > 1:
+        csv_file_path = sys.argv[1]
 
     print(f"Analyzing data from '{csv_file_path}'...")
     metrics_df = calculate_metrics_from_csv(csv_file_path)
@@ -82,4 +433,4 @@ if __name__ == "__main__":
             metrics_df.to_csv(output_filename, index=False)
             print(f"\nResults have been saved to '{output_filename}'")
         else:
-            print("\nAnalysis complete. No data was processed or no tenant IDs were found.")
\ No newline at end of file
+            print("\nAnalysis complete. No data was processed or no tenant IDs were found.")
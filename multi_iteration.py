@@ -0,0 +1,256 @@
+"""
+Multi-iteration comparison engine and stability metrics.
+
+The prediction API is not deterministic, so a tenant is often sampled N times
+(iter1.json ... iterN.json). Instead of looping over fields and iterations one
+pair at a time, all N predictions are compared at once:
+
+    - presence and exact-match flags are (fields x iterations) boolean matrices,
+      and Status_v* is resolved for the whole matrix with one np.select;
+    - the ambiguous residue (present on both sides, not an exact match) is
+      deduplicated per (field, predicted value), so a value repeated across
+      iterations is judged once, and all of it is handed to the caller's
+      'decide' callback in a single call (which lets the LLM path batch it).
+
+Stability metrics are computed from a matrix of value codes, where every
+distinct predicted value of a field (compared in canonical form, so JSON key
+order does not matter) gets an integer code and an absent prediction is -1:
+
+    agreement_rate   share of iterations that agree with the majority value
+    majority_index   first iteration holding the majority value (majority vote)
+    flip_count       number of times the value changes between consecutive iterations
+    stability_score  per tenant: mean agreement rate over fields predicted at least once
+
+window_agreement() measures the same thing over the last k predictions only; the
+early-stopping sampler in pipelining_script uses it to decide when to stop.
+
+log_stability_summary() appends a tenant's summary to a CSV next to its report,
+one row per run, so run-to-run variation can be compared across runs.
+"""
+
+import csv
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import json_codec
+from canonical_json import canonicalize
+from field_matchers import STATUS_MATCH, STATUS_MISMATCH, STATUS_PR_ABSENT, STATUS_GT_ABSENT, STATUS_BOTH_ABSENT
+
+ABSENT_CODE = -1
+
+# decide([(field_name, gt_value, pr_value), ...]) -> [(status, match_type), ...]
+DecideFn = Callable[[List[Tuple[str, Any, Any]]], List[Tuple[str, str]]]
+
+
+def classify_iterations(fields: List[str], gt_data: Dict[str, Any], pr_data_list: List[Dict[str, Any]],
+                        decide: DecideFn, absent_match_type: Optional[Callable[[str, Any], Optional[str]]] = None,
+                        default_match_type: str = "N/A") -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns (statuses, match_types) as (fields x iterations) object matrices.
+    'absent_match_type(field, gt_value)' may label cells where the GT is present but
+    the prediction is absent (e.g. hidden toggle steps).
+    """
+    return classify_matrix(fields, [gt_data] * len(pr_data_list), pr_data_list, decide,
+                           absent_match_type, default_match_type)
+
+
+def classify_matrix(fields: List[str], gt_data_list: List[Dict[str, Any]], pr_data_list: List[Dict[str, Any]],
+                    decide: DecideFn, absent_match_type: Optional[Callable[[str, Any], Optional[str]]] = None,
+                    default_match_type: str = "N/A") -> Tuple[np.ndarray, np.ndarray]:
+    """
+    General form of classify_iterations: column j compares pr_data_list[j] against
+    gt_data_list[j], so the columns can be iterations of one tenant or different tenants.
+    The residue is judged once per distinct (field, GT value, predicted value).
+    """
+    n, k = len(fields), len(pr_data_list)
+    if n == 0 or k == 0:
+        return np.empty((n, k), dtype=object), np.empty((n, k), dtype=object)
+
+    gt_present = np.array([[f in gt_data for gt_data in gt_data_list] for f in fields], dtype=bool)
+    pr_present = np.array([[f in pr_data for pr_data in pr_data_list] for f in fields], dtype=bool)
+    gt_str = np.array([[str(gt_data.get(f)).strip() for gt_data in gt_data_list] for f in fields], dtype=object)
+    pr_str = np.array([[str(pr_data.get(f)).strip() for pr_data in pr_data_list] for f in fields], dtype=object)
+
+    both_present = gt_present & pr_present
+    exact = both_present & (gt_str == pr_str)
+
+    statuses = np.select(
+        [exact, both_present, gt_present, pr_present],
+        [STATUS_MATCH, STATUS_MISMATCH, STATUS_PR_ABSENT, STATUS_GT_ABSENT],
+        default=STATUS_BOTH_ABSENT
+    ).astype(object)
+    match_types = np.where(exact, "exact_match", default_match_type).astype(object)
+
+    # Ambiguous residue, judged once per distinct (field, GT value, predicted value)
+    rows, cols = np.nonzero(both_present & ~exact)
+    unique_pairs: Dict[Tuple[int, str, str], int] = {}
+    items: List[Tuple[str, Any, Any]] = []
+    for i, j in zip(rows, cols):
+        key = (i, gt_str[i, j], pr_str[i, j])
+        if key not in unique_pairs:
+            unique_pairs[key] = len(items)
+            items.append((fields[i], gt_data_list[j][fields[i]], pr_data_list[j][fields[i]]))
+    if items:
+        decisions = decide(items)
+        for i, j in zip(rows, cols):
+            statuses[i, j], match_types[i, j] = decisions[unique_pairs[(i, gt_str[i, j], pr_str[i, j])]]
+
+    if absent_match_type is not None:
+        labels: Dict[Tuple[int, str], Optional[str]] = {}
+        for i, j in zip(*np.nonzero(gt_present & ~pr_present)):
+            key = (i, gt_str[i, j])
+            if key not in labels:
+                labels[key] = absent_match_type(fields[i], gt_data_list[j][fields[i]])
+            if labels[key] is not None:
+                match_types[i, j] = labels[key]
+
+    return statuses, match_types
+
+
+def prediction_codes(fields: List[str], pr_data_list: List[Dict[str, Any]],
+                     format_value: Callable[[Any], str]) -> np.ndarray:
+    """(fields x iterations) integer codes of the canonical predicted values; ABSENT_CODE where absent."""
+    n, k = len(fields), len(pr_data_list)
+    digests = np.array([
+        [canonicalize(format_value(pr_data[f])).digest if f in pr_data else None for pr_data in pr_data_list]
+        for f in fields
+    ], dtype=object).reshape(n * k)
+    codes, _ = pd.factorize(digests)
+    return codes.reshape(n, k)
+
+
+def field_stability(codes: np.ndarray) -> Dict[str, np.ndarray]:
+    """Agreement rate, majority-vote iteration and flip count for every field."""
+    n, k = codes.shape
+    if k == 0:
+        return {"agreement_rate": np.zeros(n), "majority_index": np.zeros(n, dtype=int),
+                "flip_count": np.zeros(n, dtype=int)}
+    votes = (codes[:, :, None] == codes[:, None, :]).sum(axis=2)
+    return {
+        "agreement_rate": votes.max(axis=1) / k,
+        "majority_index": votes.argmax(axis=1),
+        "flip_count": (codes[:, 1:] != codes[:, :-1]).sum(axis=1),
+    }
+
+
+def _coverage_accuracy(statuses: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-column (iteration) coverage and accuracy of a (fields x iterations) status matrix."""
+    # Imported here because metrics_calc imports filetype_evaluator, which imports this module
+    from metrics_calc import count_statuses, coverage_accuracy
+    if not statuses.shape[1]:
+        return np.zeros(0), np.zeros(0)
+    report = pd.DataFrame({f"Status_v{j + 1}": statuses[:, j] for j in range(statuses.shape[1])})
+    counts = count_statuses(report, ())
+    return coverage_accuracy(counts['gt_present_pr_present_match'], counts['gt_present_pr_present_mismatch'],
+                             counts['gt_present_pr_absent'])
+
+
+def summarize_iterations(statuses: np.ndarray, codes: np.ndarray,
+                         stability: Optional[Dict[str, np.ndarray]] = None) -> Dict[str, Any]:
+    """Per-iteration and majority-vote coverage/accuracy plus the tenant stability score."""
+    stability = stability or field_stability(codes)
+    n, k = statuses.shape
+    coverage, accuracy = _coverage_accuracy(statuses)
+    majority_statuses = statuses[np.arange(n), stability["majority_index"]][:, None] if k else statuses
+    majority_coverage, majority_accuracy = _coverage_accuracy(majority_statuses)
+
+    predicted = (codes != ABSENT_CODE).any(axis=1)
+    agreement = stability["agreement_rate"][predicted]
+    return {
+        "iterations": k,
+        "coverage_per_iteration": [round(float(c), 4) for c in coverage],
+        "accuracy_per_iteration": [round(float(a), 4) for a in accuracy],
+        "mean_coverage": round(float(coverage.mean()), 4) if k else 0.0,
+        "mean_accuracy": round(float(accuracy.mean()), 4) if k else 0.0,
+        "majority_coverage": round(float(majority_coverage[0]), 4) if k else 0.0,
+        "majority_accuracy": round(float(majority_accuracy[0]), 4) if k else 0.0,
+        "stability_score": round(float(agreement.mean()), 4) if agreement.size else 1.0,
+        "unstable_fields": int((stability["flip_count"] > 0).sum()),
+        "total_flips": int(stability["flip_count"].sum()),
+    }
+
+
+STABILITY_LOG_COLUMNS = ['Timestamp', 'fileTypeId', 'tenantId', 'iterations', 'mean_coverage', 'mean_accuracy',
+                         'majority_coverage', 'majority_accuracy', 'stability_score', 'unstable_fields',
+                         'total_flips', 'coverage_per_iteration', 'accuracy_per_iteration']
+
+
+def stability_log_path(run_output_path: str, tenant_id: str) -> str:
+    """The tenant's stability CSV, next to its coverage report."""
+    return os.path.join(run_output_path, f"stability_{tenant_id}.csv")
+
+
+def log_stability_summary(file_path: str, file_type_id: str, tenant_id: str, summary: Dict[str, Any]) -> None:
+    """Appends one run's summarize_iterations() result to the tenant's stability CSV."""
+    file_exists = os.path.isfile(file_path)
+    with open(file_path, 'a', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        if not file_exists:
+            writer.writerow(STABILITY_LOG_COLUMNS)
+        writer.writerow([time.strftime('%Y-%m-%d %H:%M:%S'), file_type_id, tenant_id] +
+                        [summary[column] for column in STABILITY_LOG_COLUMNS[3:11]] +
+                        ['; '.join(str(v) for v in summary['coverage_per_iteration']),
+                         '; '.join(str(v) for v in summary['accuracy_per_iteration'])])
+
+
+def format_value(value: Any) -> str:
+    """Report form of a field value (JSON for dicts/lists, "" for None)."""
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return json_codec.dumps_report(value)
+    return str(value)
+
+
+def flatten_prediction(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Lower-cased field → value map of a prediction response (top-level fields plus 'suggestions')."""
+    flattened = {key.lower(): value for key, value in data.items() if key.lower() != 'suggestions'}
+    if isinstance(data.get('suggestions'), dict):
+        flattened.update((key.lower(), value) for key, value in data['suggestions'].items())
+    return flattened
+
+
+def window_agreement(pr_data_list: List[Dict[str, Any]], window: int,
+                     ignored_fields: Optional[set] = None) -> float:
+    """
+    Share of fields whose canonical value (or absence) is identical across the last
+    'window' predictions; 0.0 until 'window' predictions are available.
+    """
+    recent = pr_data_list[-window:] if window > 0 else []
+    if len(recent) < max(window, 1):
+        return 0.0
+    fields = sorted(set().union(*recent) - (ignored_fields or set()))
+    if not fields:
+        return 1.0
+    stability = field_stability(prediction_codes(fields, recent, format_value))
+    return float((stability["agreement_rate"] == 1.0).mean())
+
+
+def build_iteration_report(fields: List[str], gt_data: Dict[str, Any], pr_data_list: List[Dict[str, Any]],
+                           statuses: np.ndarray, match_types: np.ndarray, codes: np.ndarray,
+                           format_value: Callable[[Any], str],
+                           stability: Optional[Dict[str, np.ndarray]] = None) -> pd.DataFrame:
+    """Wide report: per-iteration Predicted_Value/Status/Match_Type columns followed by the stability columns."""
+    stability = stability or field_stability(codes)
+    report = {
+        "FieldName": fields,
+        "Ground_Truth_Value": [format_value(gt_data.get(f)) for f in fields],
+    }
+    predicted_values = [[format_value(pr_data.get(f)) for f in fields] for pr_data in pr_data_list]
+    for j, values in enumerate(predicted_values):
+        version = j + 1
+        report[f"Predicted_Value_v{version}"] = values
+        report[f"Status_v{version}"] = statuses[:, j]
+        report[f"Match_Type_v{version}"] = match_types[:, j]
+
+    rows = np.arange(len(fields))
+    majority = stability["majority_index"]
+    report["Majority_Prediction"] = [predicted_values[m][i] for i, m in zip(rows, majority)] if pr_data_list else ""
+    report["Majority_Status"] = statuses[rows, majority] if pr_data_list else ""
+    report["Agreement_Rate"] = np.round(stability["agreement_rate"], 4)
+    report["Flip_Count"] = stability["flip_count"]
+    return pd.DataFrame(report)
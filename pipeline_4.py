@@ -24,6 +24,8 @@ import time
 import pandas as pd
 from typing import Dict, List, Any, Optional
 from dotenv import load_dotenv
+from multi_iteration import (classify_iterations, prediction_codes, field_stability, summarize_iterations,
+                             build_iteration_report, stability_log_path, log_stability_summary)
 
 # --- Library Setup ---
 try:
@@ -327,53 +329,42 @@ class PredictionComparator:
         except Exception as e:
             print(f"✗ Error loading ground truth file {self.gt_path}: {e}"); return {}
 
-    def compare_and_generate_report(self, output_csv_path: str):
+    def compare_and_generate_report(self, output_csv_path: str) -> Optional[Dict[str, Any]]:
         print("\n🔄 Starting comparison process...")
         gt_data = self._load_ground_truth_data()
         pr_data_list = [self._load_prediction_data(path) for path in self.pr_paths]
-        if not gt_data: print("✗ Aborting due to error in loading ground truth data."); return
+        if not gt_data: print("✗ Aborting due to error in loading ground truth data."); return None
         all_fields_to_check = self.exhaustive_fields.union(gt_data.keys())
         for pr_data in pr_data_list: all_fields_to_check.update(pr_data.keys())
         final_fields = sorted([f for f in all_fields_to_check if f.lower() not in self.ignored_fields])
         print(f"✓ Comparing a total of {len(final_fields)} fields across {len(self.pr_paths)} iterations.")
-        report_data = []
-        for field in final_fields:
-            gt_present, gt_value = field in gt_data, gt_data.get(field)
-            row = {"FieldName": field, "Ground_Truth_Value": self._format_value(gt_value)}
-            for i, pr_data in enumerate(pr_data_list):
-                version = i + 1
-                pr_present, pr_value = field in pr_data, pr_data.get(field)
-                status, match_type = "", "N/A"
-                if gt_present and pr_present:
-                    status, match_type = self._determine_match_status(field, gt_value, pr_value)
-                elif gt_present and not pr_present:
-                    status = "GT Present PR Absent"
-                    if field.startswith('toggle-'):
-                        gt_str = self._format_value(gt_value)
-                        if self._is_json_string(gt_str):
-                            try:
-                                gt_json = json.loads(gt_str)
-                                if gt_json.get('hidden') is True:
-                                    match_type = "correctly_absent_as_hidden"
-                            except json.JSONDecodeError:
-                                pass
-                elif not gt_present and pr_present:
-                    status = "GT Absent PR Present"
-                elif not gt_present and not pr_present:
-                    status = "GT Absent PR Absent"
-                row[f"Predicted_Value_v{version}"] = self._format_value(pr_value)
-                row[f"Status_v{version}"] = status
-                row[f"Match_Type_v{version}"] = match_type
-            report_data.append(row)
-        if not report_data: print("⚠️ No data to write to report."); return
+        statuses, match_types = classify_iterations(
+            final_fields, gt_data, pr_data_list,
+            lambda items: [self._determine_match_status(*item) for item in items],
+            self._absent_match_type, default_match_type="N/A")
+        codes = prediction_codes(final_fields, pr_data_list, self._format_value)
+        stability = field_stability(codes)
+        summary = summarize_iterations(statuses, codes, stability)
+        report_df = build_iteration_report(final_fields, gt_data, pr_data_list, statuses, match_types, codes,
+                                           self._format_value, stability)
+        if report_df.empty: print("⚠️ No data to write to report."); return None
         try:
-            with open(output_csv_path, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=report_data[0].keys())
-                writer.writeheader()
-                writer.writerows(report_data)
+            report_df.to_csv(output_csv_path, index=False)
             print(f"\n✅ Successfully generated comparison report: {output_csv_path}")
         except Exception as e:
             print(f"✗ Error writing to CSV file {output_csv_path}: {e}")
+        print(f"   📊 Mean Accuracy: {summary['mean_accuracy']:.4f}, Majority-vote Accuracy: {summary['majority_accuracy']:.4f}")
+        print(f"   📊 Stability Score: {summary['stability_score']:.4f} ({summary['unstable_fields']} fields changed between iterations, {summary['total_flips']} flips)")
+        return summary
+
+    def _absent_match_type(self, field_name: str, gt_value: Any) -> Optional[str]:
+        if field_name.startswith('toggle-'):
+            gt_str = self._format_value(gt_value)
+            if self._is_json_string(gt_str):
+                try:
+                    if json.loads(gt_str).get('hidden') is True: return "correctly_absent_as_hidden"
+                except (json.JSONDecodeError, AttributeError): pass
+        return None
 
     def _determine_match_status(self, field_name: str, gt_value: Any, pr_value: Any) -> tuple[str, str]:
         gt_str, pr_str = str(gt_value).strip(), str(pr_value).strip()
@@ -565,7 +556,12 @@ def main():
             prediction_paths=[prediction_file_path],
             all_possible_fields=exhaustive_field_list
         )
-        comparator.compare_and_generate_report(output_report_file)
+        summary = comparator.compare_and_generate_report(output_report_file)
+        if summary:
+            # One row per run, so the tenant's run-to-run variation can be compared later
+            stability_file = stability_log_path(run_output_path, tenant_id)
+            log_stability_summary(stability_file, file_type_id, tenant_id, summary)
+            print(f"✅ Stability summary appended to: {stability_file}")
 
         if os.path.exists(output_report_file):
             df = pd.read_csv(output_report_file)
@@ -15,8 +15,12 @@ import csv
 import os
 import glob
 import requests
-from typing import Dict, List, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple
 from dotenv import load_dotenv
+from multi_iteration import (classify_iterations, prediction_codes, field_stability, summarize_iterations,
+                             build_iteration_report, flatten_prediction, window_agreement, stability_log_path,
+                             log_stability_summary)
 
 # --- Library Setup ---
 try:
@@ -46,33 +50,141 @@ def find_tenant_info(tenant_id_to_find: str, tenant_info_folder: str) -> Optiona
     print(f"   ✗ Tenant Info for '{tenant_id_to_find}' not found in any files.")
     return None
 
-def fetch_and_save_predictions(api_endpoint: str, headers: Dict[str, str], payload: Dict[str, Any], num_iterations: int, output_dir: str) -> List[str]:
+# Prediction requests in flight at once; this script samples a single tenant, so this is the only cap
+MAX_CONCURRENT_ITERATIONS_PER_TENANT = 5
+
+
+def _fetch_iteration(api_endpoint: str, headers: Dict[str, str], payload: Dict[str, Any], output_dir: str,
+                     iteration_num: int, num_iterations: int) -> Optional[str]:
+    """Requests one prediction and saves it as iter<N>.json; returns the file path, or None on failure."""
+    print(f"   Fetching iteration {iteration_num}/{num_iterations}...")
+    response = None
+    try:
+        response = requests.post(api_endpoint, headers=headers, json=payload , verify=False)
+        response.raise_for_status()
+        prediction_data = response.json()
+        file_path = os.path.join(output_dir, f"iter{iteration_num}.json")
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump(prediction_data, f, indent=4)
+        print(f"   ✓ Iteration {iteration_num}: saved to {file_path}")
+        return file_path
+    except requests.exceptions.HTTPError as http_err:
+        print(f"   ✗ Iteration {iteration_num}: HTTP error: {http_err}"); print(f"   Response body: {response.text}")
+    except requests.exceptions.RequestException as req_err:
+        print(f"   ✗ Iteration {iteration_num}: Request failed: {req_err}")
+    except json.JSONDecodeError:
+        print(f"   ✗ Iteration {iteration_num}: Failed to decode JSON. Response text: {response.text}")
+    except Exception as e:
+        # Any other failure (e.g. writing the file) only drops this iteration
+        print(f"   ✗ Iteration {iteration_num}: Unexpected error: {e}")
+    return None
+
+
+def fetch_and_save_predictions(api_endpoint: str, headers: Dict[str, str], payload: Dict[str, Any], num_iterations: int, output_dir: str,
+                               max_concurrency: int = MAX_CONCURRENT_ITERATIONS_PER_TENANT) -> List[str]:
+    """
+    Requests the N iterations concurrently, at most 'max_concurrency' at a time. Failed iterations are skipped,
+    so whatever succeeded is still returned for scoring.
+    """
     print(f"\n🚀 Starting to fetch {num_iterations} predictions from API...")
-    saved_files = []
     if not os.path.exists(output_dir):
         print(f"   Creating output directory: {output_dir}")
         os.makedirs(output_dir)
-    for i in range(num_iterations):
-        iteration_num = i + 1
-        print(f"   Fetching iteration {iteration_num}/{num_iterations}...")
-        try:
-            response = requests.post(api_endpoint, headers=headers, json=payload , verify=False)
-            response.raise_for_status()
-            prediction_data = response.json()
-            file_path = os.path.join(output_dir, f"iter{iteration_num}.json")
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(prediction_data, f, indent=4)
-            print(f"   ✓ Successfully saved to {file_path}")
-            saved_files.append(file_path)
-        except requests.exceptions.HTTPError as http_err:
-            print(f"   ✗ HTTP error: {http_err}"); print(f"   Response body: {response.text}"); return []
-        except requests.exceptions.RequestException as req_err:
-            print(f"   ✗ Request failed: {req_err}"); return []
-        except json.JSONDecodeError:
-            print(f"   ✗ Failed to decode JSON. Response text: {response.text}"); return []
-    print(f"✅ Finished fetching all predictions.")
+    if num_iterations < 1:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, num_iterations))) as pool:
+        results = list(pool.map(
+            lambda n: _fetch_iteration(api_endpoint, headers, payload, output_dir, n, num_iterations),
+            range(1, num_iterations + 1)
+        ))
+    saved_files = [path for path in results if path]
+    if len(saved_files) == num_iterations:
+        print(f"✅ Finished fetching all predictions.")
+    elif saved_files:
+        print(f"⚠️ Fetched {len(saved_files)}/{num_iterations} predictions; scoring the successful iterations.")
+    else:
+        print(f"✗ All {num_iterations} prediction requests failed.")
     return saved_files
 
+# Fields excluded from comparison and from the early-stop agreement check
+IGNORED_FIELDS = {
+    "filedestination", "filename", "lookback", "integrationmode",
+    "notificationemailaddress", "notificationstart", "notificationwarning",
+    "notificationfailure", "notificationsuccess", "notificationcreateticket",
+    "requiresfileinput", "eventinginfo", "eventbasedtriggers",
+    "publishingconfiguration", "integrationid", "tenantid",
+    "integrationname", "vendor", "filetypeid", "customername",
+    "createddate", "updateddate", "deleted", "runtype",
+    "runautomatically", "cron", "_source_file", "_tenant_id", "ui_statusmap", "globaltenantid"
+}
+
+# Early-stopping sampler defaults
+EARLY_STOP_WINDOW = 2
+EARLY_STOP_AGREEMENT = 0.99
+SAMPLING_LOG_FILE = "sampling_log.csv"
+
+
+def sample_until_stable(api_endpoint: str, headers: Dict[str, str], payload: Dict[str, Any], max_iterations: int,
+                        output_dir: str, window: int = EARLY_STOP_WINDOW,
+                        agreement_threshold: float = EARLY_STOP_AGREEMENT,
+                        ignored_fields: Optional[set] = None) -> Tuple[List[str], Dict[str, Any]]:
+    """
+    Adaptive version of fetch_and_save_predictions: the first 'window' iterations are
+    requested concurrently, then one more at a time until the last 'window' predictions
+    agree on at least 'agreement_threshold' of the fields, or 'max_iterations' requests
+    have been made. Fields in 'ignored_fields' (default IGNORED_FIELDS) do not count
+    towards agreement. Returns the saved files and {iterations, failed, agreement, stop_reason}.
+    """
+    print(f"\n🚀 Sampling predictions until {window} consecutive responses agree "
+          f"(threshold {agreement_threshold:.0%}, max {max_iterations})...")
+    os.makedirs(output_dir, exist_ok=True)
+    window = max(1, min(window, max_iterations))
+    ignored_fields = IGNORED_FIELDS if ignored_fields is None else ignored_fields
+    saved_files: List[str] = []
+    pr_data_list: List[Dict[str, Any]] = []
+    attempts, agreement, stop_reason = 0, 0.0, "max_iterations"
+
+    def request(iteration_nums: List[int]) -> None:
+        with ThreadPoolExecutor(max_workers=max(1, min(MAX_CONCURRENT_ITERATIONS_PER_TENANT, len(iteration_nums)))) as pool:
+            results = list(pool.map(
+                lambda n: _fetch_iteration(api_endpoint, headers, payload, output_dir, n, max_iterations),
+                iteration_nums
+            ))
+        for path in results:
+            if path:
+                with open(path, 'r', encoding='utf-8') as f:
+                    pr_data_list.append(flatten_prediction(json.load(f)))
+                saved_files.append(path)
+
+    while attempts < max_iterations:
+        wave = window if attempts == 0 else 1
+        request(list(range(attempts + 1, attempts + wave + 1)))
+        attempts += wave
+        agreement = window_agreement(pr_data_list, window, ignored_fields)
+        print(f"   📊 After {attempts} requests ({len(saved_files)} ok): agreement over last {window} = {agreement:.2%}")
+        if len(pr_data_list) >= window and agreement >= agreement_threshold:
+            stop_reason = "converged"
+            break
+
+    if not saved_files:
+        stop_reason = "all_failed"
+    summary = {"iterations": len(saved_files), "failed": attempts - len(saved_files),
+               "agreement": round(agreement, 4), "stop_reason": stop_reason}
+    print(f"✅ Sampling stopped ({stop_reason}) after {attempts} requests; {len(saved_files)} predictions saved.")
+    return saved_files, summary
+
+
+def log_sampling_result(file_path: str, file_type_id: str, tenant_id: str, summary: Dict[str, Any]):
+    """Appends a tenant's iteration count and stopping reason to the sampling log CSV."""
+    file_exists = os.path.isfile(file_path)
+    with open(file_path, 'a', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        if not file_exists:
+            writer.writerow(['fileTypeId', 'tenantId', 'iterations', 'failed', 'agreement', 'stop_reason'])
+        writer.writerow([file_type_id, tenant_id, summary['iterations'], summary['failed'],
+                         summary['agreement'], summary['stop_reason']])
+
+
 def generate_exhaustive_field_list(instances_json_path: str) -> List[str]:
     print(f"\n🔍 Generating exhaustive field list from: {instances_json_path}")
     try:
@@ -97,16 +209,7 @@ class PredictionComparator:
         self.pr_paths = prediction_paths
         self.exhaustive_fields = set(field.lower() for field in all_possible_fields)
         self.llm_model = self.setup_llm()
-        self.ignored_fields = {
-            "filedestination", "filename", "lookback", "integrationmode",
-            "notificationemailaddress", "notificationstart", "notificationwarning",
-            "notificationfailure", "notificationsuccess", "notificationcreateticket",
-            "requiresfileinput", "eventinginfo", "eventbasedtriggers",
-            "publishingconfiguration", "integrationid", "tenantid",
-            "integrationname", "vendor", "filetypeid", "customername",
-            "createddate", "updateddate", "deleted", "runtype",
-            "runautomatically", "cron", "_source_file", "_tenant_id", "ui_statusmap", "globaltenantid"
-        }
+        self.ignored_fields = IGNORED_FIELDS
     def setup_llm(self) -> Optional[Any]:
         if not LLM_AVAILABLE: return None
         try:
@@ -140,54 +243,42 @@ class PredictionComparator:
             return {k.lower(): v for k, v in gt_data.items()}
         except Exception as e: print(f"✗ Error loading ground truth file {self.gt_path}: {e}"); return {}
     
-    def compare_and_generate_report(self, output_csv_path: str):
+    def compare_and_generate_report(self, output_csv_path: str) -> Optional[Dict[str, Any]]:
         print("\n🔄 Starting comparison process...")
         gt_data = self._load_ground_truth_data()
         pr_data_list = [self._load_prediction_data(path) for path in self.pr_paths]
-        if not gt_data: print("✗ Aborting due to error in loading ground truth data."); return
+        if not gt_data: print("✗ Aborting due to error in loading ground truth data."); return None
         all_fields_to_check = self.exhaustive_fields.union(gt_data.keys())
         for pr_data in pr_data_list: all_fields_to_check.update(pr_data.keys())
         final_fields = sorted([f for f in all_fields_to_check if f.lower() not in self.ignored_fields])
         print(f"✓ Comparing a total of {len(final_fields)} fields across {len(self.pr_paths)} iterations.")
-        report_data = []
-        for field in final_fields:
-            gt_present, gt_value = field in gt_data, gt_data.get(field)
-            row = {"FieldName": field, "Ground_Truth_Value": self._format_value(gt_value)}
-            for i, pr_data in enumerate(pr_data_list):
-                version = i + 1
-                pr_present, pr_value = field in pr_data, pr_data.get(field)
-                status, match_type = "", "N"
-                if gt_present and pr_present:
-                    status, match_type = self._determine_match_status(field, gt_value, pr_value)
-                elif gt_present and not pr_present:
-                    status = "GT Present PR Absent"
-                    if field.startswith('toggle-'):
-                        gt_str = self._format_value(gt_value)
-                        if self._is_json_string(gt_str):
-                            try:
-                                gt_json = json.loads(gt_str)
-                                if gt_json.get('hidden') is True:
-                                    match_type = "GT Present PR Present and match"
-                            except json.JSONDecodeError:
-                                pass
-                elif not gt_present and pr_present:
-                    status = "GT Absent PR Present"
-                elif not gt_present and not pr_present:
-                    status = "GT Absent PR Absent"
-                
-                row[f"Predicted_Value_v{version}"] = self._format_value(pr_value)
-                row[f"Status_v{version}"] = status
-                row[f"Match_Type_v{version}"] = match_type
-            report_data.append(row)
-        
-        if not report_data: print("⚠️ No data to write to report."); return
+        statuses, match_types = classify_iterations(
+            final_fields, gt_data, pr_data_list,
+            lambda items: [self._determine_match_status(*item) for item in items],
+            self._absent_match_type, default_match_type="N")
+        codes = prediction_codes(final_fields, pr_data_list, self._format_value)
+        stability = field_stability(codes)
+        summary = summarize_iterations(statuses, codes, stability)
+        report_df = build_iteration_report(final_fields, gt_data, pr_data_list, statuses, match_types, codes,
+                                           self._format_value, stability)
+        if report_df.empty: print("⚠️ No data to write to report."); return None
         try:
-            with open(output_csv_path, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=report_data[0].keys())
-                writer.writeheader()
-                writer.writerows(report_data)
+            report_df.to_csv(output_csv_path, index=False)
             print(f"\n✅ Successfully generated comparison report: {output_csv_path}")
-        except Exception as e: print(f"✗ Error writing to CSV file {output_csv_path}: {e}")
+        except Exception as e:
+            print(f"✗ Error writing to CSV file {output_csv_path}: {e}")
+        print(f"   📊 Mean Accuracy: {summary['mean_accuracy']:.4f}, Majority-vote Accuracy: {summary['majority_accuracy']:.4f}")
+        print(f"   📊 Stability Score: {summary['stability_score']:.4f} ({summary['unstable_fields']} fields changed between iterations, {summary['total_flips']} flips)")
+        return summary
+
+    def _absent_match_type(self, field_name: str, gt_value: Any) -> Optional[str]:
+        if field_name.startswith('toggle-'):
+            gt_str = self._format_value(gt_value)
+            if self._is_json_string(gt_str):
+                try:
+                    if json.loads(gt_str).get('hidden') is True: return "GT Present PR Present and match"
+                except (json.JSONDecodeError, AttributeError): pass
+        return None
 
     def _determine_match_status(self, field_name: str, gt_value: Any, pr_value: Any) -> tuple[str, str]:
         gt_str, pr_str = str(gt_value).strip(), str(pr_value).strip()
@@ -301,6 +392,7 @@ def main():
     
     num_iterations_str = input(f"Enter number of iterations [{DEFAULT_NUM_ITERATIONS}]: ") or str(DEFAULT_NUM_ITERATIONS)
     num_iterations = int(num_iterations_str)
+    early_stop = (input("Stop early once predictions agree? (yes/no) [no]: ").strip().lower() or "no") == "yes"
 
     if not all([file_type_id, integration_id, tenant_id, bearer_token]):
         print("\n✗ One or more required inputs were left blank. Aborting.")
@@ -341,13 +433,24 @@ def main():
     }
 
     # --- Step 4: Fetch Predictions from API ---
-    prediction_file_paths = fetch_and_save_predictions(
-        api_endpoint=DEFAULT_API_ENDPOINT,
-        headers=headers,
-        payload=payload,
-        num_iterations=num_iterations,
-        output_dir=run_output_path
-    )
+    if early_stop:
+        # num_iterations is the upper bound; stable tenants stop after EARLY_STOP_WINDOW agreeing responses
+        prediction_file_paths, sampling_summary = sample_until_stable(
+            api_endpoint=DEFAULT_API_ENDPOINT,
+            headers=headers,
+            payload=payload,
+            max_iterations=num_iterations,
+            output_dir=run_output_path
+        )
+        log_sampling_result(SAMPLING_LOG_FILE, file_type_id, tenant_id, sampling_summary)
+    else:
+        prediction_file_paths = fetch_and_save_predictions(
+            api_endpoint=DEFAULT_API_ENDPOINT,
+            headers=headers,
+            payload=payload,
+            num_iterations=num_iterations,
+            output_dir=run_output_path
+        )
     if not prediction_file_paths:
         print("\n✗ Aborting comparison because API fetching failed.")
         return
@@ -358,7 +461,12 @@ def main():
         prediction_paths=prediction_file_paths,
         all_possible_fields=exhaustive_field_list
     )
-    comparator.compare_and_generate_report(output_report_file)
+    summary = comparator.compare_and_generate_report(output_report_file)
+    if summary:
+        # One row per run, so the tenant's run-to-run variation can be compared later
+        stability_file = stability_log_path(run_output_path, tenant_id)
+        log_stability_summary(stability_file, file_type_id, tenant_id, summary)
+        print(f"✅ Stability summary appended to: {stability_file}")
     print("\n🎉 Workflow complete!")
 
 if __name__ == "__main__":
@@ -0,0 +1,171 @@
+"""
+Append-only writer for the consolidated report.
+
+Each tenant's rows are written (and flushed) as soon as the caller appends them,
+so the caller can drop them right away instead of keeping the whole fileType in
+memory; main() appends every tenant as soon as it has been compared. Supported
+formats:
+
+    csv      plain CSV (the default, same layout as before)
+    csv.gz   gzip-compressed CSV, appended one gzip member per tenant
+    parquet  one Parquet row group per tenant (requires 'pyarrow')
+
+CSV and csv.gz files hold every tenant appended so far even if the run stops
+early; a Parquet file is only readable once close() has written its footer.
+An existing report at the path is only replaced by the first non-empty append,
+so a run that writes no tenant leaves the previous report in place.
+
+The writer is a context manager:
+
+    with ConsolidatedReportWriter(path_without_extension, "csv.gz") as writer:
+        for tenant_df in ...:
+            writer.append(tenant_df)
+
+Columnar report datasets
+------------------------
+With the Parquet output mode every report is also written as a Hive-partitioned
+dataset, so many runs can be loaded (and filtered) together:
+
+    <dataset folder>/<report>/fileTypeId=<fileTypeId>/run=<run id>/<part>.parquet
+
+Columns keep their types (counts are integers, rates and latencies floats, the
+extra-fields list a list of strings) and the low-cardinality Status*/Match_Type*
+columns are dictionary-encoded. load_report_dataset() reads a report back, with
+fileTypeId and run restored from the partition path.
+"""
+
+import gzip
+import os
+from typing import Any, Optional
+
+import pandas as pd
+
+# --- Library Setup ---
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+REPORT_FORMATS = ("csv", "csv.gz", "parquet")
+DICTIONARY_COLUMN_PREFIXES = ("Status", "Match_Type", "Majority_Status")
+PARTITION_COLUMNS = ("fileTypeId", "run")
+
+
+def to_arrow_table(df: pd.DataFrame, drop_columns: tuple = PARTITION_COLUMNS) -> "pa.Table":
+    """Typed Arrow table of a report frame, with the status/match-type columns dictionary-encoded."""
+    arrays, names = [], []
+    for name in df.columns:
+        if name in drop_columns:
+            continue
+        column = df[name]
+        if str(name).startswith(DICTIONARY_COLUMN_PREFIXES):
+            array = pa.array(column.astype(str).tolist(), type=pa.string()).dictionary_encode()
+        else:
+            try:
+                array = pa.array(column, from_pandas=True)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                # Mixed-type object columns are stored as text
+                array = pa.array(column.astype(str).tolist(), type=pa.string())
+        arrays.append(array)
+        names.append(str(name))
+    return pa.Table.from_arrays(arrays, names=names)
+
+
+def report_partition_path(dataset_folder: str, report_name: str, file_type_id: str, run_id: str,
+                          part: str = "part-0") -> str:
+    """Path (without extension) of one file of a partitioned report dataset."""
+    return os.path.join(dataset_folder, report_name, f"fileTypeId={file_type_id}", f"run={run_id}", part)
+
+
+def write_report_dataset(df: pd.DataFrame, dataset_folder: str, report_name: str, file_type_id: str,
+                         run_id: str, part: str = "part-0") -> Optional[str]:
+    """Writes one report frame into its fileTypeId/run partition. Returns the file path, or None on failure."""
+    if not PYARROW_AVAILABLE:
+        print(f"✗ The 'pyarrow' package is required to write the {report_name} dataset.")
+        return None
+    path = report_partition_path(dataset_folder, report_name, file_type_id, run_id, part) + ".parquet"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        pq.write_table(to_arrow_table(df), path)
+        return path
+    except Exception as e:
+        print(f"✗ Error writing {report_name} dataset file {path}: {e}")
+        return None
+
+
+def load_report_dataset(dataset_folder: str, report_name: str, file_type_id: Optional[str] = None,
+                        run_id: Optional[str] = None) -> pd.DataFrame:
+    """Loads a report dataset across runs, optionally restricted to one fileTypeId and/or run."""
+    if not PYARROW_AVAILABLE:
+        raise ImportError("The 'pyarrow' package is required to load report datasets.")
+    partitioning = ds.partitioning(
+        pa.schema([("fileTypeId", pa.string()), ("run", pa.string())]), flavor="hive")
+    dataset = ds.dataset(os.path.join(dataset_folder, report_name), format="parquet", partitioning=partitioning)
+    condition = None
+    for column, value in (("fileTypeId", file_type_id), ("run", run_id)):
+        if value is not None:
+            expression = ds.field(column) == value
+            condition = expression if condition is None else condition & expression
+    return dataset.to_table(filter=condition).to_pandas()
+
+
+class ConsolidatedReportWriter:
+    """Streams tenant report frames into one consolidated file."""
+
+    def __init__(self, base_path: str, report_format: str = "csv"):
+        if report_format not in REPORT_FORMATS:
+            raise ValueError(f"Unknown report format '{report_format}'. Use one of {', '.join(REPORT_FORMATS)}.")
+        if report_format == "parquet" and not PYARROW_AVAILABLE:
+            print("⚠️ Warning: 'pyarrow' package not found. Writing the consolidated report as CSV instead.")
+            report_format = "csv"
+        self.format = report_format
+        self.path = f"{base_path}.{report_format}"
+        self.rows_written = 0
+        self.tenants_written = 0
+        self._columns: Optional[list] = None
+        self._parquet_writer: Optional[Any] = None
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+
+    def append(self, df: pd.DataFrame) -> None:
+        """Writes one tenant's rows and flushes them to disk."""
+        if df.empty:
+            return
+        if self._columns is None:
+            self._columns = list(df.columns)
+        df = df.reindex(columns=self._columns)
+        header = self.rows_written == 0
+        if header and os.path.exists(self.path):
+            # Replace the previous run's report only once there is something to write
+            os.remove(self.path)
+
+        if self.format == "csv":
+            with open(self.path, "a", newline="", encoding="utf-8") as f:
+                df.to_csv(f, index=False, header=header)
+        elif self.format == "csv.gz":
+            with gzip.open(self.path, "at", newline="", encoding="utf-8") as f:
+                df.to_csv(f, index=False, header=header)
+        else:
+            table = to_arrow_table(df, drop_columns=())
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self.path, table.schema)
+            else:
+                table = table.cast(self._parquet_writer.schema)
+            self._parquet_writer.write_table(table)
+
+        self.rows_written += len(df)
+        self.tenants_written += 1
+
+    def close(self) -> None:
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+            self._parquet_writer = None
+
+    def __enter__(self) -> "ConsolidatedReportWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
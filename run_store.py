@@ -0,0 +1,328 @@
+"""
+Historical run store with regression detection.
+
+outputs/<fileTypeId>/metrics_summary.csv is overwritten by every run, so each
+pipeline run is also recorded in a local SQLite file:
+
+    runs              one row per run: run id (the log timestamp), start time and
+                      the run configuration as JSON (model, prompt version,
+                      partial-match settings, endpoints, ...)
+    tenant_metrics    the per-tenant metrics of every fileTypeId in the run
+    latency_samples   every prediction API latency measured in the run
+
+compare() checks a candidate run against a baseline, per fileTypeId:
+
+    coverage / accuracy   pooled over the fileType's fields; the fields of one tenant
+                          are not independent, so the p-value comes from the paired
+                          tenant bootstrap (metrics_calc.paired_bootstrap_test) over
+                          the tenants both runs share. A drop is flagged when p < alpha
+                          and the drop is at least 'min_delta'; with fewer than
+                          'min_tenants' shared tenants there is no p-value and no flag.
+    p95 latency           bootstrap of the p95 from each run's latency samples; a rise
+                          is flagged when the one-sided p < alpha and the candidate p95
+                          exceeds the baseline p95 by more than 'latency_tolerance'
+                          (relative). Both runs need 'min_latency_samples' samples.
+                          main() records one sample per tenant, so a single fileType
+                          rarely has enough; the samples of all shared fileTypes are
+                          therefore also pooled into one run-wide row (fileTypeId "ALL").
+
+Rows without enough samples for a test get status "insufficient data" instead of a
+p-value; the others are "ok" or "regression".
+
+Command line:
+    python run_store.py list
+    python run_store.py show <run_id>
+    python run_store.py compare <baseline_run_id> [<candidate_run_id>] [--alpha 0.05]
+    python run_store.py paired <baseline_run_id> [<candidate_run_id>] [--resamples 10000]
+
+'compare' exits with status 1 when it flags a regression, so it can gate a CI job.
+'paired' runs metrics_calc.paired_bootstrap_test over the tenants both runs share.
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import json_codec
+from comparison_result import STATUS_COUNT_KEYS
+from metrics_calc import DEFAULT_RESAMPLES, compute_metrics, paired_bootstrap_test
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_RUN_STORE_PATH = os.path.join(SCRIPT_DIR, "outputs", "run_store.sqlite")
+
+DEFAULT_ALPHA = 0.05
+DEFAULT_MIN_DELTA = 0.01
+DEFAULT_LATENCY_TOLERANCE = 0.2
+DEFAULT_MIN_TENANTS = 3
+DEFAULT_MIN_LATENCY_SAMPLES = 10
+DEFAULT_SEED = 0
+ALL_FILE_TYPES = "ALL"  # fileTypeId of the pooled run-wide latency row
+STATUS_OK, STATUS_REGRESSION, STATUS_INSUFFICIENT = "ok", "regression", "insufficient data"
+
+METRIC_COLUMNS = ("total_fields", *STATUS_COUNT_KEYS, "coverage", "accuracy", "extra_fields_count",
+                  "prediction_latency_seconds")
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS runs ("
+    " run_id TEXT PRIMARY KEY, started_at REAL NOT NULL, config TEXT)",
+    "CREATE TABLE IF NOT EXISTS tenant_metrics ("
+    " run_id TEXT NOT NULL, fileTypeId TEXT NOT NULL, tenantId TEXT NOT NULL,"
+    " accountStructureFile TEXT NOT NULL DEFAULT '', integrationId TEXT,"
+    " total_fields INTEGER, gt_present_pr_present_match INTEGER, gt_present_pr_present_mismatch INTEGER,"
+    " gt_present_pr_absent INTEGER, gt_absent_pr_present INTEGER, gt_absent_pr_absent INTEGER,"
+    " coverage REAL, accuracy REAL, extra_fields_count INTEGER, prediction_latency_seconds REAL,"
+    " PRIMARY KEY (run_id, fileTypeId, tenantId, accountStructureFile))",
+    "CREATE TABLE IF NOT EXISTS latency_samples ("
+    " run_id TEXT NOT NULL, fileTypeId TEXT NOT NULL, tenantId TEXT, api_endpoint TEXT,"
+    " latency_seconds REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS idx_latency_run ON latency_samples(run_id, fileTypeId)",
+)
+
+
+def p95_rise_p_value(base_samples: np.ndarray, cand_samples: np.ndarray, resamples: int = DEFAULT_RESAMPLES,
+                     seed: Optional[int] = DEFAULT_SEED) -> float:
+    """
+    One-sided bootstrap p-value for 'the candidate p95 latency is higher than the baseline
+    p95': each run's samples are resampled independently and the p95s compared.
+    """
+    rng = np.random.default_rng(seed)
+    base_p95 = np.percentile(base_samples[rng.integers(0, len(base_samples), (resamples, len(base_samples)))],
+                             95, axis=1)
+    cand_p95 = np.percentile(cand_samples[rng.integers(0, len(cand_samples), (resamples, len(cand_samples)))],
+                             95, axis=1)
+    return min(1.0, (1 + int((cand_p95 - base_p95 <= 0).sum())) / (resamples + 1))
+
+
+class RunStore:
+    """SQLite store of run configurations, per-tenant metrics and latency samples."""
+
+    def __init__(self, db_path: str = DEFAULT_RUN_STORE_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+        self._conn.commit()
+
+    # --- Recording ---
+
+    def start_run(self, run_id: str, config: Optional[Dict[str, Any]] = None) -> None:
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO runs (run_id, started_at, config) VALUES (?, ?, ?)",
+                               (run_id, time.time(), json_codec.dumps(config or {})))
+            self._conn.commit()
+
+    def record_file_type(self, run_id: str, file_type_id: str, tenant_metrics: List[Dict[str, Any]],
+                         latency_rows: Optional[List[Dict[str, Any]]] = None) -> None:
+        """Stores (or replaces) one fileTypeId's tenant metrics and latency samples for a run."""
+        metric_rows = [
+            (run_id, file_type_id, str(m.get('tenantId', '')), str(m.get('accountStructureFile') or ''),
+             m.get('integrationId'), *[m.get(column) for column in METRIC_COLUMNS])
+            for m in tenant_metrics
+        ]
+        latency = [
+            (run_id, file_type_id, row.get('tenantId'), row.get('api_endpoint'), float(row['latency_seconds']))
+            for row in latency_rows or [] if row.get('latency_seconds') is not None
+        ]
+        placeholders = ", ".join("?" * (5 + len(METRIC_COLUMNS)))
+        with self._lock:
+            self._conn.execute("INSERT OR IGNORE INTO runs (run_id, started_at, config) VALUES (?, ?, '{}')",
+                               (run_id, time.time()))
+            self._conn.execute("DELETE FROM tenant_metrics WHERE run_id = ? AND fileTypeId = ?",
+                               (run_id, file_type_id))
+            self._conn.execute("DELETE FROM latency_samples WHERE run_id = ? AND fileTypeId = ?",
+                               (run_id, file_type_id))
+            self._conn.executemany(
+                f"INSERT INTO tenant_metrics (run_id, fileTypeId, tenantId, accountStructureFile, integrationId, "
+                f"{', '.join(METRIC_COLUMNS)}) VALUES ({placeholders})", metric_rows)
+            self._conn.executemany(
+                "INSERT INTO latency_samples (run_id, fileTypeId, tenantId, api_endpoint, latency_seconds)"
+                " VALUES (?, ?, ?, ?, ?)", latency)
+            self._conn.commit()
+
+    # --- Queries ---
+
+    def _query(self, sql: str, params: tuple = ()) -> pd.DataFrame:
+        with self._lock:
+            return pd.read_sql_query(sql, self._conn, params=params)
+
+    def runs(self) -> pd.DataFrame:
+        """All runs, newest first, with how many fileTypes and tenants each one recorded."""
+        return self._query(
+            "SELECT r.run_id, datetime(r.started_at, 'unixepoch', 'localtime') AS started,"
+            " COUNT(DISTINCT m.fileTypeId) AS file_types, COUNT(m.tenantId) AS tenants"
+            " FROM runs r LEFT JOIN tenant_metrics m ON m.run_id = r.run_id"
+            " GROUP BY r.run_id ORDER BY r.started_at DESC")
+
+    def latest_run_id(self, exclude: Optional[str] = None) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT run_id FROM runs WHERE run_id != ? ORDER BY started_at DESC LIMIT 1",
+                                     (exclude or "",)).fetchone()
+        return row[0] if row else None
+
+    def run_config(self, run_id: str) -> Dict[str, Any]:
+        with self._lock:
+            row = self._conn.execute("SELECT config FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        return json_codec.loads(row[0]) if row and row[0] else {}
+
+    def tenant_metrics(self, run_id: str) -> pd.DataFrame:
+        return self._query("SELECT * FROM tenant_metrics WHERE run_id = ? ORDER BY fileTypeId, tenantId", (run_id,))
+
+    def latency_samples(self, run_id: str) -> pd.DataFrame:
+        return self._query("SELECT fileTypeId, latency_seconds FROM latency_samples WHERE run_id = ?", (run_id,))
+
+    def file_type_summary(self, run_id: str) -> pd.DataFrame:
+        """Pooled coverage/accuracy and latency statistics per fileTypeId of a run."""
+        metrics = self.tenant_metrics(run_id)
+        summary = compute_metrics(metrics)['fileType'].drop(columns='iteration')
+
+        latency = self.latency_samples(run_id)
+        stats = latency.groupby('fileTypeId')['latency_seconds'].agg(
+            latency_samples='count', latency_mean='mean', latency_p50='median',
+            latency_p95=lambda s: float(np.percentile(s, 95)))
+        return summary.merge(stats.reset_index(), on='fileTypeId', how='left')
+
+    # --- Regression detection ---
+
+    def compare(self, baseline_run_id: str, candidate_run_id: str, alpha: float = DEFAULT_ALPHA,
+                min_delta: float = DEFAULT_MIN_DELTA, latency_tolerance: float = DEFAULT_LATENCY_TOLERANCE,
+                min_tenants: int = DEFAULT_MIN_TENANTS, min_latency_samples: int = DEFAULT_MIN_LATENCY_SAMPLES,
+                resamples: int = DEFAULT_RESAMPLES, seed: Optional[int] = DEFAULT_SEED) -> pd.DataFrame:
+        """
+        One row per (fileTypeId, metric) present in both runs, plus the pooled "ALL" latency
+        row, with the baseline and candidate values, the change, the number of samples behind
+        the test (shared tenants, or the smaller latency sample count), the p-value, a
+        'regression' flag and a status ("ok", "regression" or "insufficient data").
+        """
+        base = self.file_type_summary(baseline_run_id).set_index('fileTypeId')
+        cand = self.file_type_summary(candidate_run_id).set_index('fileTypeId')
+        paired = paired_bootstrap_test(self.tenant_metrics(baseline_run_id), self.tenant_metrics(candidate_run_id),
+                                       level="tenant", resamples=resamples, seed=seed)
+        paired = paired.set_index(['fileTypeId', 'metric']) if not paired.empty else paired
+        base_latency = self.latency_samples(baseline_run_id)
+        cand_latency = self.latency_samples(candidate_run_id)
+
+        def latency_row(file_type_id: str, b_samples: np.ndarray, c_samples: np.ndarray) -> Dict[str, Any]:
+            b_p95, c_p95 = float(np.percentile(b_samples, 95)), float(np.percentile(c_samples, 95))
+            samples = min(len(b_samples), len(c_samples))
+            p_value = round(p95_rise_p_value(b_samples, c_samples, resamples, seed), 4) \
+                if samples >= min_latency_samples else None
+            return {'fileTypeId': file_type_id, 'metric': 'latency_p95', 'baseline': b_p95, 'candidate': c_p95,
+                    'delta': round(c_p95 - b_p95, 4), 'samples': samples, 'p_value': p_value,
+                    'regression': bool(p_value is not None and p_value < alpha
+                                       and c_p95 - b_p95 > latency_tolerance * b_p95)}
+
+        rows = []
+        shared = sorted(base.index.intersection(cand.index))
+        for file_type_id in shared:
+            b, c = base.loc[file_type_id], cand.loc[file_type_id]
+            for metric in ('coverage', 'accuracy'):
+                test = paired.loc[(file_type_id, metric)] if (file_type_id, metric) in paired.index else None
+                pairs = int(test['pairs']) if test is not None else 0
+                p_value = float(test['p_value']) if test is not None and pairs >= min_tenants else None
+                delta = float(c[metric] - b[metric])
+                rows.append({'fileTypeId': file_type_id, 'metric': metric, 'baseline': float(b[metric]),
+                             'candidate': float(c[metric]), 'delta': round(delta, 4), 'samples': pairs,
+                             'p_value': p_value,
+                             'regression': bool(p_value is not None and p_value < alpha and -delta >= min_delta)})
+
+            if pd.notna(b['latency_p95']) and pd.notna(c['latency_p95']):
+                rows.append(latency_row(
+                    file_type_id,
+                    base_latency.loc[base_latency['fileTypeId'] == file_type_id, 'latency_seconds'].to_numpy(float),
+                    cand_latency.loc[cand_latency['fileTypeId'] == file_type_id, 'latency_seconds'].to_numpy(float)))
+
+        # Run-wide latency over the fileTypes both runs measured
+        b_pooled = base_latency.loc[base_latency['fileTypeId'].isin(shared), 'latency_seconds'].to_numpy(float)
+        c_pooled = cand_latency.loc[cand_latency['fileTypeId'].isin(shared), 'latency_seconds'].to_numpy(float)
+        if len(b_pooled) and len(c_pooled):
+            rows.append(latency_row(ALL_FILE_TYPES, b_pooled, c_pooled))
+
+        result = pd.DataFrame(rows, columns=['fileTypeId', 'metric', 'baseline', 'candidate', 'delta', 'samples',
+                                             'p_value', 'regression'])
+        result['status'] = np.where(result['regression'], STATUS_REGRESSION,
+                                    np.where(result['p_value'].isna(), STATUS_INSUFFICIENT, STATUS_OK))
+        return result
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Query the pipeline run store and detect regressions between runs.")
+    parser.add_argument("--db", default=DEFAULT_RUN_STORE_PATH, help="Path of the run store SQLite file.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="List recorded runs, newest first.")
+    show = commands.add_parser("show", help="Show a run's configuration and per-fileType summary.")
+    show.add_argument("run_id")
+    compare = commands.add_parser("compare", help="Compare a candidate run (default: latest) against a baseline.")
+    compare.add_argument("baseline_run_id")
+    compare.add_argument("candidate_run_id", nargs="?")
+    compare.add_argument("--alpha", type=float, default=DEFAULT_ALPHA)
+    compare.add_argument("--min-delta", type=float, default=DEFAULT_MIN_DELTA)
+    compare.add_argument("--latency-tolerance", type=float, default=DEFAULT_LATENCY_TOLERANCE)
+    compare.add_argument("--min-tenants", type=int, default=DEFAULT_MIN_TENANTS)
+    compare.add_argument("--min-latency-samples", type=int, default=DEFAULT_MIN_LATENCY_SAMPLES)
+    compare.add_argument("--resamples", type=int, default=DEFAULT_RESAMPLES)
+    paired = commands.add_parser("paired", help="Paired tenant bootstrap of coverage/accuracy between two runs.")
+    paired.add_argument("baseline_run_id")
+    paired.add_argument("candidate_run_id", nargs="?")
+    paired.add_argument("--resamples", type=int, default=DEFAULT_RESAMPLES)
+    paired.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    store = RunStore(args.db)
+    try:
+        if args.command == "list":
+            print(store.runs().to_string(index=False))
+            return 0
+
+        if args.command == "show":
+            print(f"📊 Run {args.run_id}")
+            for key, value in store.run_config(args.run_id).items():
+                print(f"   {key}: {value}")
+            print(store.file_type_summary(args.run_id).to_string(index=False))
+            return 0
+
+        candidate = args.candidate_run_id or store.latest_run_id(exclude=args.baseline_run_id)
+        if candidate is None:
+            print("✗ No candidate run to compare against the baseline.")
+            return 2
+        print(f"🔄 Comparing run {candidate} against baseline {args.baseline_run_id}")
+        if args.command == "paired":
+            result = paired_bootstrap_test(store.tenant_metrics(args.baseline_run_id), store.tenant_metrics(candidate),
+                                           level="tenant", resamples=args.resamples, seed=args.seed)
+            print(result.to_string(index=False) if not result.empty else "⚠️ The two runs have no tenants in common.")
+            return 0
+        result = store.compare(args.baseline_run_id, candidate, args.alpha, args.min_delta, args.latency_tolerance,
+                               args.min_tenants, args.min_latency_samples, args.resamples)
+        if result.empty:
+            print("⚠️ The two runs have no fileTypeId in common.")
+            return 0
+        print(result.to_string(index=False))
+        insufficient = result[result['status'] == STATUS_INSUFFICIENT]
+        if not insufficient.empty:
+            print(f"⚠️ {len(insufficient)} rows have too few samples to test (fewer than {args.min_tenants} shared "
+                  f"tenants or {args.min_latency_samples} latency samples per run); they are never flagged.")
+        regressions = result[result['regression']]
+        if regressions.empty:
+            print("✅ No regressions detected.")
+            return 0
+        for row in regressions.itertuples():
+            print(f"✗ Regression in {row.fileTypeId}: {row.metric} {row.baseline:.4f} → {row.candidate:.4f}")
+        return 1
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,42 @@
+"""Regression tests for the incremental stdlib decoder in instances_reader."""
+
+import io
+import json
+import os
+
+import pytest
+
+from instances_reader import _iter_array_stdlib, iter_instances
+
+DOCUMENTS = [
+    '[12345, 678]',
+    '[-1.5e10, 0.125, 7, -0]',
+    '[true, false, null, "x"]',
+    '  [ {"a": [1, 2, {"b": "]"}], "c": "[[]]"} , {"d": {"e": {"f": [null]}}}, [] ]  ',
+    '[{"tenantId": "t1", "value": "a ] b, c", "n": 1234567890}, {"tenantId": "t2", "esc": "\\"]\\\\"}]',
+    '[{"unicode": "caf\\u00e9 ü", "nested": [[[[123456]]]]}]',
+    '[]',
+]
+
+
+@pytest.mark.parametrize("document", DOCUMENTS)
+def test_every_chunk_size_matches_json_load(document):
+    expected = json.loads(document)
+    for chunk_size in range(1, len(document) + 2):
+        assert list(_iter_array_stdlib(io.StringIO(document), chunk_size)) == expected, chunk_size
+
+
+def test_bundled_instances_match_json_load():
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "priority_integration_data",
+                        "usg.cigna.834-proclaim", "instances.json")
+    with open(path, "r", encoding="utf-8") as f:
+        expected = json.load(f)
+    assert list(iter_instances(path)) == expected
+    with open(path, "r", encoding="utf-8") as f:
+        assert list(_iter_array_stdlib(f, chunk_size=7)) == expected
+
+
+@pytest.mark.parametrize("document", ['{"a": 1}', '[1, 2', '[1 2]', '[1, 2,'])
+def test_malformed_arrays_raise(document):
+    with pytest.raises(ValueError):
+        list(_iter_array_stdlib(io.StringIO(document), chunk_size=2))